@@ -0,0 +1,129 @@
+import os
+import threading
+from bisect import bisect_left
+import pandas as pd
+
+from ml.dataset import FINAL_DF_PATH, load_final_df, typed_path
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class DatasetSnapshot:
+    """final_df plus the per-season views the page routes need.
+
+    Treat `df` as read-only: the same frame is shared by every request in
+    the process.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.seasons = []
+        # season -> [{"round", "date", "circuit"}] ordered by round
+        self.calendar = {}
+        # (season, round) -> circuit key, e.g. "albert_park"
+        self.circuit_by_round = {}
+        # Sorted (date, season, round) for every dated round
+        self.race_calendar = []
+        self._race_dates = []
+        self._last_dated_round = None
+
+        if df.empty or 'season' not in df.columns or 'round' not in df.columns:
+            return
+
+        self.seasons = sorted(df['season'].dropna().astype(int).unique().tolist())
+
+        rounds_df = df.dropna(subset=['season', 'round']).drop_duplicates(subset=['season', 'round'])
+        if 'circuit' in rounds_df.columns:
+            circuits = rounds_df['circuit'].astype(object).where(rounds_df['circuit'].notna(), None).tolist()
+        else:
+            circuits = [None] * len(rounds_df)
+
+        dates = rounds_df['date'].tolist() if 'date' in rounds_df.columns else [None] * len(rounds_df)
+        entries = zip(
+            rounds_df['season'].astype(int).tolist(),
+            rounds_df['round'].tolist(),
+            dates,
+            circuits,
+            strict=True,
+        )
+        for season, round_num, date, circuit in entries:
+            try:
+                round_num = int(round_num)
+            except (TypeError, ValueError):
+                continue
+            self.circuit_by_round[(season, round_num)] = circuit
+            self.calendar.setdefault(season, []).append({
+                "round": round_num,
+                "date": date if isinstance(date, str) else None,
+                "circuit": circuit,
+            })
+
+        for rounds in self.calendar.values():
+            rounds.sort(key=lambda r: r["round"])
+
+        if 'date' in rounds_df.columns:
+            parsed = pd.to_datetime(rounds_df['date'], dayfirst=True, errors='coerce')
+            dated = rounds_df.loc[parsed.notna(), ['season', 'round']]
+            self.race_calendar = sorted(zip(
+                [ts.to_pydatetime() for ts in parsed[parsed.notna()]],
+                dated['season'].astype(int).tolist(),
+                dated['round'].astype(int).tolist(),
+                strict=True,
+            ))
+            self._race_dates = [entry[0] for entry in self.race_calendar]
+            if self.race_calendar:
+                self._last_dated_round = max(entry[2] for entry in self.race_calendar)
+
+    def next_round(self, now):
+        """Round of the first race dated at or after `now`, else the highest dated round."""
+        if not self.race_calendar:
+            return None
+        idx = bisect_left(self._race_dates, now)
+        if idx < len(self.race_calendar):
+            return self.race_calendar[idx][2]
+        return self._last_dated_round
+
+
+class DatasetService:
+    """Loads final_df once per process and reloads it when the file changes."""
+
+    def __init__(self, csv_path=FINAL_DF_PATH):
+        self.csv_path = csv_path
+        self._lock = threading.Lock()
+        # (signature, snapshot) swapped as a single reference
+        self._state = (None, None)
+
+    def _current_signature(self):
+        return (_file_signature(self.csv_path), _file_signature(typed_path(self.csv_path)))
+
+    def get(self):
+        signature = self._current_signature()
+        cached_signature, snapshot = self._state
+        if snapshot is not None and signature == cached_signature:
+            return snapshot
+
+        with self._lock:
+            signature = self._current_signature()
+            cached_signature, snapshot = self._state
+            if snapshot is not None and signature == cached_signature:
+                return snapshot
+
+            try:
+                df = load_final_df(self.csv_path)
+            except Exception as e:
+                print(f"[WARN] Could not load final_df from {self.csv_path}: {e}")
+                df = pd.DataFrame()
+
+            snapshot = DatasetSnapshot(df)
+            # Loading from CSV may have just written the typed bundle
+            self._state = (self._current_signature(), snapshot)
+            return snapshot
+
+
+dataset_service = DatasetService()
@@ -0,0 +1,269 @@
+import copy
+import json
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+import uuid
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, which runs a single server process: jobs are
+    # then only deduplicated within it, and any job it does not own is dead
+    fcntl = None
+
+from ml.artifacts import write_json_atomic, write_text_atomic
+from ml.model_cache import MODEL_CACHE_DIR
+
+# One <id>.json per job, readable by every worker process
+JOBS_DIR = os.path.join(MODEL_CACHE_DIR, "jobs")
+# Held while a job runs, so no two jobs in any process write the prediction
+# artifacts at the same time
+RUN_LOCK_PATH = os.path.join(MODEL_CACHE_DIR, ".predictions_rebuild.lock")
+
+# Finished jobs kept around for the status endpoint
+MAX_FINISHED_JOBS = 50
+ACTIVE_STATUSES = ("queued", "running")
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def _file_lock(path):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class JobQueue:
+    """Runs long jobs one at a time on a background thread, shared across processes.
+
+    Job state lives in JOBS_DIR, so any worker process can report on a job
+    another one queued. Jobs are identified by `kind`: submitting a kind that
+    is already queued or running in any process returns the existing job.
+    The owning process holds a lock file per job while it is active; a job
+    whose owner has exited is marked failed instead of blocking its kind.
+    Jobs run under RUN_LOCK_PATH, one at a time across all processes.
+    Without fcntl only this process's own jobs count as alive, so run a
+    single server process there.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, run_lock_path=RUN_LOCK_PATH, max_finished=MAX_FINISHED_JOBS):
+        self.jobs_dir = jobs_dir
+        self.run_lock_path = run_lock_path
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        # Jobs owned by this process that have not finished, and their held lock files
+        self._jobs = {}
+        self._owner_locks = {}
+        self._stage_started = {}
+        self._worker = None
+
+    def _job_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _owner_lock_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.lock")
+
+    def _active_path(self, kind):
+        return os.path.join(self.jobs_dir, f"active_{kind}")
+
+    def _submit_lock(self):
+        return _file_lock(os.path.join(self.jobs_dir, ".submit.lock"))
+
+    def _write(self, job):
+        write_json_atomic(self._job_path(job["id"]), job, indent=2)
+
+    def _read(self, job_id):
+        try:
+            with open(self._job_path(job_id), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _owner_alive(self, job_id):
+        if job_id in self._owner_locks:
+            return True
+        if fcntl is None:
+            # No way to probe another process: a job this one does not own
+            # was left behind by an earlier run (Ctrl-C, crash, reloader restart)
+            _remove_if_exists(self._owner_lock_path(job_id))
+            return False
+        with open(self._owner_lock_path(job_id), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        os.remove(self._owner_lock_path(job_id))
+        return False
+
+    def _reap(self, job_id):
+        """Current state of `job_id`, marked failed if its owner process has exited.
+
+        Callers hold the submit lock, which the owner also takes to finish.
+        """
+        job = self._read(job_id)
+        if job is not None and job["status"] in ACTIVE_STATUSES and not self._owner_alive(job_id):
+            job.update(status="failed", error="Worker process exited before the job finished", finished_at=_now())
+            self._write(job)
+        return job
+
+    def _active_job(self, kind):
+        try:
+            with open(self._active_path(kind), "r") as f:
+                job_id = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        job = self._reap(job_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return None
+        return job
+
+    def submit(self, kind, stages, fn):
+        """Queue `fn(progress)` as a `kind` job; returns (job snapshot, created).
+
+        `stages` names the steps reported in the job's progress, and
+        `fn` calls `progress(stage, status)` as it moves through them.
+        """
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        with self._lock, self._submit_lock():
+            active = self._active_job(kind)
+            if active is not None:
+                return active, False
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "submitted_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "stages": {name: {"status": "pending", "seconds": None} for name in stages},
+                "result": None,
+                "error": None,
+            }
+            self._ensure_worker()
+
+            # Undone if any step fails: closing the handle releases the lock
+            with ExitStack() as on_error:
+                on_error.callback(_remove_if_exists, self._job_path(job_id))
+                on_error.callback(_remove_if_exists, self._owner_lock_path(job_id))
+                owner_lock = on_error.enter_context(open(self._owner_lock_path(job_id), "a"))
+                if fcntl is not None:
+                    fcntl.flock(owner_lock, fcntl.LOCK_EX)
+                self._write(job)
+                write_text_atomic(self._active_path(kind), job_id)
+                on_error.pop_all()
+
+            self._owner_locks[job_id] = owner_lock
+            self._jobs[job_id] = job
+            self._queue.put((job_id, fn))
+            return copy.deepcopy(job), True
+
+    def get(self, job_id):
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        job = self._read(job_id)
+        if job is not None and job["status"] in ACTIVE_STATUSES and job_id not in self._jobs:
+            with self._lock, self._submit_lock():
+                job = self._reap(job_id)
+        return job
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="ml-jobs", daemon=True)
+            self._worker.start()
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            self._write(job)
+
+    def _progress(self, job_id, stage, status):
+        with self._lock:
+            entry = self._jobs[job_id]["stages"].setdefault(stage, {"status": "pending", "seconds": None})
+            if status == "running":
+                self._stage_started[job_id, stage] = time.perf_counter()
+            elif (job_id, stage) in self._stage_started:
+                entry["seconds"] = round(time.perf_counter() - self._stage_started.pop((job_id, stage)), 3)
+            entry["status"] = status
+            self._write(self._jobs[job_id])
+
+    def _run(self):
+        while True:
+            job_id, fn = self._queue.get()
+            with _file_lock(self.run_lock_path):
+                self._update(job_id, status="running", started_at=_now())
+                try:
+                    result = fn(lambda stage, status: self._progress(job_id, stage, status))
+                    status, error = "succeeded", None
+                except Exception as e:
+                    traceback.print_exc()
+                    result, status, error = None, "failed", str(e)
+            self._finish(job_id, status=status, result=result, error=error, finished_at=_now())
+
+    def _finish(self, job_id, **changes):
+        with self._lock, self._submit_lock():
+            job = self._jobs.pop(job_id)
+            job.update(changes)
+            for stage in job["stages"]:
+                self._stage_started.pop((job_id, stage), None)
+
+            active_path = self._active_path(job["kind"])
+            try:
+                with open(active_path, "r") as f:
+                    if f.read().strip() == job_id:
+                        os.remove(active_path)
+            except FileNotFoundError:
+                pass
+
+            # Closing the file releases the owner lock. Reapers hold the submit
+            # lock too, so none sees the job active with its owner gone.
+            self._owner_locks.pop(job_id).close()
+            os.remove(self._owner_lock_path(job_id))
+            self._write(job)
+            self._prune()
+
+    def _prune(self):
+        finished = []
+        for name in os.listdir(self.jobs_dir):
+            job_id, ext = os.path.splitext(name)
+            if ext != ".json" or job_id in self._jobs:
+                continue
+            path = os.path.join(self.jobs_dir, name)
+            job = self._read(job_id)
+            if job is not None and job["status"] not in ACTIVE_STATUSES:
+                finished.append((os.path.getmtime(path), path))
+        excess = len(finished) - self.max_finished
+        for _, path in sorted(finished)[:max(excess, 0)]:
+            os.remove(path)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,27 @@
+from ml.pipeline import PIPELINE_STAGES, run_prediction_pipeline
+
+from app.job_queue import job_queue
+
+# Retry-After sent while the predictions are being rebuilt
+REBUILD_RETRY_AFTER = 30
+
+PREDICTION_STAGES = [name for name, _ in PIPELINE_STAGES]
+
+
+class RebuildInProgress(Exception):
+    """The ML artifacts are missing and a background retrain is regenerating them."""
+
+    def __init__(self, job_id, retry_after=REBUILD_RETRY_AFTER):
+        super().__init__("ML predictions are being rebuilt")
+        self.job_id = job_id
+        self.retry_after = retry_after
+
+
+def train_job(progress):
+    _, timings = run_prediction_pipeline(on_stage=progress)
+    return {"timings": timings}
+
+
+def submit_train_job():
+    """(job, created) for a background retrain; shared with /ml/train, so at most one runs."""
+    return job_queue.submit("train", PREDICTION_STAGES, train_job)
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+
+from ml.driver_strength_predictor import RESULTS_PATH_DRIVERS
+from ml.gp_predictor import RESULTS_PATH_GP
+from ml.constructor_strength_predictor import RESULTS_PATH_CONSTRUCTORS
+from ml.artifacts import write_json_atomic
+from ml.standings import RESULTS_PATH_STANDINGS, build_standings, gp_predictions_digest
+
+ARTIFACT_PATHS = {
+    "gp": RESULTS_PATH_GP,
+    "drivers": RESULTS_PATH_DRIVERS,
+    "constructors": RESULTS_PATH_CONSTRUCTORS,
+}
+
+
+def _artifact_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _index_rounds(season_entries):
+    by_round = {}
+    for season_entry in season_entries:
+        season = int(season_entry.get("season", -1))
+        for rnd_entry in season_entry.get("rounds", []):
+            by_round[(season, int(rnd_entry.get("round", -1)))] = rnd_entry
+    return by_round
+
+
+class PredictionSnapshot:
+    """Immutable view over one generation of the three ML artifacts."""
+
+    def __init__(self, gp_results_all, driver_strengths_all, constructor_strengths_all):
+        self.gp_by_round = _index_rounds(gp_results_all)
+        self.drivers_by_round = {
+            key: rnd_entry.get("predictions", [])
+            for key, rnd_entry in _index_rounds(driver_strengths_all).items()
+        }
+        self.constructors_by_round = {
+            key: rnd_entry.get("predictions", [])
+            for key, rnd_entry in _index_rounds(constructor_strengths_all).items()
+        }
+
+        self.driver_extremes_by_season = {
+            int(s.get("season", -1)): s.get("driver_extremes", {})
+            for s in driver_strengths_all
+        }
+
+    def season_rounds(self, season):
+        return sorted(rnd for (s, rnd) in self.gp_by_round if s == season)
+
+    def gp_round(self, season, roundnum):
+        return self.gp_by_round.get((season, roundnum))
+
+    def driver_strengths(self, season, roundnum):
+        return self.drivers_by_round.get((season, roundnum), [])
+
+    def constructor_strengths(self, season, roundnum):
+        return self.constructors_by_round.get((season, roundnum), [])
+
+    def driver_extremes(self, season):
+        return self.driver_extremes_by_season.get(season, {})
+
+
+class PredictionStore:
+    """Process-level cache of the ML artifacts, reloaded when any file changes.
+
+    A reload builds a complete new snapshot before swapping it in, so readers
+    never observe a mix of old and new artifacts.
+    """
+
+    def __init__(self, paths=None):
+        self.paths = dict(paths or ARTIFACT_PATHS)
+        self._lock = threading.Lock()
+        # (signature, snapshot) swapped as a single reference
+        self._state = (None, None)
+
+    def _current_signature(self):
+        return tuple(_artifact_signature(self.paths[name]) for name in sorted(self.paths))
+
+    def get(self):
+        # Raises FileNotFoundError if an artifact is missing and
+        # json.JSONDecodeError if one cannot be parsed.
+        signature = self._current_signature()
+        cached_signature, snapshot = self._state
+        if snapshot is not None and signature == cached_signature:
+            return snapshot
+
+        with self._lock:
+            signature = self._current_signature()
+            cached_signature, snapshot = self._state
+            if snapshot is not None and signature == cached_signature:
+                return snapshot
+
+            loaded = {}
+            for name, path in self.paths.items():
+                with open(path, "r") as f:
+                    loaded[name] = json.load(f)
+
+            snapshot = PredictionSnapshot(loaded["gp"], loaded["drivers"], loaded["constructors"])
+            self._state = (signature, snapshot)
+            return snapshot
+
+
+class StandingsStore:
+    """Pre-serialized standings responses keyed by season.
+
+    Served from the materialized standings artifact; recomputed from the GP
+    predictions only when their content no longer matches the digest the
+    artifact was built from.
+    """
+
+    def __init__(self, gp_path=RESULTS_PATH_GP, standings_path=RESULTS_PATH_STANDINGS):
+        self.gp_path = gp_path
+        self.standings_path = standings_path
+        self._lock = threading.Lock()
+        # (gp signature, {season: serialized response})
+        self._state = (None, None)
+
+    def _load_materialized(self, digest):
+        try:
+            with open(self.standings_path, "r") as f:
+                standings = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if standings.get("gp_predictions_sha256") != digest:
+            return None
+        return standings
+
+    def get(self):
+        # Raises FileNotFoundError / json.JSONDecodeError for a missing or
+        # unreadable GP predictions artifact.
+        signature = _artifact_signature(self.gp_path)
+        cached_signature, responses = self._state
+        if responses is not None and signature == cached_signature:
+            return responses
+
+        with self._lock:
+            signature = _artifact_signature(self.gp_path)
+            cached_signature, responses = self._state
+            if responses is not None and signature == cached_signature:
+                return responses
+
+            with open(self.gp_path, "r") as f:
+                raw = f.read()
+            digest = gp_predictions_digest(raw)
+
+            standings = self._load_materialized(digest)
+            if standings is None:
+                standings = build_standings(json.loads(raw), digest)
+                # Persisting only saves the next process a recompute; serve regardless
+                try:
+                    write_json_atomic(self.standings_path, standings)
+                except OSError as e:
+                    print(f"[WARN] Could not save standings to {self.standings_path}: {e}")
+
+            responses = {
+                int(season): json.dumps(data)
+                for season, data in standings.get("seasons", {}).items()
+            }
+            self._state = (signature, responses)
+            return responses
+
+
+prediction_store = PredictionStore()
+standings_store = StandingsStore()
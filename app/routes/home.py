@@ -1,148 +1,20 @@
-import os
 import json
-import pandas as pd
 from flask import Blueprint, redirect, render_template, url_for
 from typing import Any
 from datetime import datetime
 
 from metadata.track_metadata import TRACK_METADATA
+from app.dataset_service import dataset_service
+from app.track_registry import build_track_from_key, track_registry
 
 CURRENT_SEASON = 2025
 MIN_SEASON = 2010
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-FINAL_DF_PATH = os.path.join(BASE_DIR, "ml", "final_df.csv")
 SEASON_COMPLETE = -1
 
-try:
-    _FINAL_DF = pd.read_csv(FINAL_DF_PATH)
-except Exception as e:
-    _FINAL_DF = pd.DataFrame()
-
 home_bp = Blueprint("home", __name__)
 
 def available_seasons():
-    if _FINAL_DF.empty:
-        return []
-    seasons = sorted(_FINAL_DF['season'].dropna().astype(int).unique().tolist())
-    return [s for s in seasons if s >= MIN_SEASON]
-
-def circuit_key_from_row(row):
-    if row is None or row.empty:
-        return None
-    for col in row.index:
-        if col.startswith('circuit_id_') and pd.notna(row[col]) and int(row[col]) == 1:
-            return col.replace('circuit_id_', '')
-    return None
-
-def day_with_suffix(day: int) -> str:
-    if 11 <= day <= 13:
-        return f"{day}th"
-    last_digit = day % 10
-    if last_digit == 1:
-        return f"{day}st"
-    elif last_digit == 2:
-        return f"{day}nd"
-    elif last_digit == 3:
-        return f"{day}rd"
-    else:
-        return f"{day}th"
-
-def build_track_from_key(key, round_num=None, track_date=None):
-    meta = TRACK_METADATA.get(key, {})
-    formatted_date = ""
-    if track_date is not None:
-        try:
-            dt = datetime.strptime(track_date, "%Y-%m-%d")
-            formatted_date = f"{day_with_suffix(dt.day)} {dt.strftime('%B')}"
-        except Exception:
-            formatted_date = track_date
-
-    return {
-        "id": key,
-        "display_name": meta.get("display_name", key.replace('_', ' ').title()),
-        "layout": meta.get("layout", ""),
-        "flag": meta.get("flag", ""),
-        "detailed_flag": meta.get("detailed_flag", ""),
-        "annotated_layout": meta.get("annotated_layout", ""),
-        "detailed_track_image": meta.get("detailed_track_image", ""),
-        "detailed_track_attribution": meta.get("detailed_track_attribution", ""),
-        "round": int(round_num) if round_num is not None else meta.get("round"),
-        "wiki": meta.get("wiki", ""),
-        "date": formatted_date if formatted_date else meta.get("date", "")
-    }
-
-# build tracklist for a past season from final_df
-def get_tracks_from_df_for_season(year: int):
-    if _FINAL_DF.empty:
-        return []
-
-    df_year = _FINAL_DF[_FINAL_DF['season'] == int(year)]
-    if df_year.empty:
-        return []
-
-    if 'round' in df_year.columns:
-        df_year = df_year.sort_values('round').drop_duplicates(subset=['round'])
-    else:
-        df_year = df_year.reset_index(drop=True)
-
-    tracks = []
-
-    for _, row in df_year.iterrows():
-        try:
-            round_num = int(row['round'])
-        except (TypeError, ValueError):
-            continue
-
-        key = None
-        track_date = None
-        for track_key, meta in TRACK_METADATA.items():
-            circuit_col = meta.get("circuit_id")
-            if isinstance(circuit_col, str) and circuit_col in row.index:
-                val = row[circuit_col]
-                if pd.notna(val) and int(val) == 1:
-                    key = track_key
-                    track_date = row.get('date')
-                    break
-
-        if key:
-            t = build_track_from_key(key, round_num, track_date)
-            tracks.append(t)
-        else:
-            circuit_col_name = None
-            for col in row.index:
-                if not col.startswith("circuit_id_"):
-                    continue
-                value = row.get(col)
-                if pd.isna(value):
-                    continue
-
-                try:
-                    if int(value) == 1:
-                        circuit_col_name = col[len("circuit_id_"):]
-                        break
-                except (TypeError, ValueError):
-                    continue
-
-            placeholder_id = circuit_col_name.replace('_', '-') if circuit_col_name else f"round-{round_num}"
-            placeholder_display_name = circuit_col_name.replace('_', ' ').title() if circuit_col_name else f"Round {round_num}"
-
-            placeholder = {
-                "id": placeholder_id,
-                "display_name": placeholder_display_name,
-                "f1_website": "2024/united-arab-emirates",
-                "flag": "Flag_of_Placeholder.png",
-                "detailed_flag": "Placeholder.png",
-                "annotated_layout": "placeholder.avif",
-                "layout": "placeholder.png",
-                "detailed_track_image": "placeholder_detailed_track.jpg",
-                "detailed_track_attribution": "",
-                "round": round_num,
-                "wiki": "",
-                "date": "1st January",
-            }
-            tracks.append(placeholder)
-
-    return tracks
+    return [s for s in dataset_service.get().seasons if s >= MIN_SEASON]
 
 def get_placeholder_current_season_tracks():
     tracklist = []
@@ -161,18 +33,8 @@ def get_placeholder_current_season_tracks():
     return tracklist
 
 def get_next_track() -> int:
-    df = pd.read_csv(FINAL_DF_PATH)
-    df['date'] = pd.to_datetime(df['date'], dayfirst=True, errors='coerce')
-    df = df.dropna(subset=['date'])
-
-    today = datetime.today()
-
-    upcoming_races = df[df['date'] >= today]
-
-    if not upcoming_races.empty:
-        return int(upcoming_races.iloc[0]['round'])
-    else:
-        return int(df['round'].max())
+    # Binary search over the calendar index built when the dataset loads
+    return dataset_service.get().next_round(datetime.today())
 
 
 # Homepage route
@@ -184,7 +46,7 @@ def homepage_root():
         year = MIN_SEASON
 
     if year in seasons:
-        tracks = get_tracks_from_df_for_season(year)
+        tracks = track_registry.season_tracks(year)
         next_round = get_next_track() if year == CURRENT_SEASON else SEASON_COMPLETE
     else:
         tracks = get_placeholder_current_season_tracks()
@@ -207,7 +69,7 @@ def homepage_year(year):
     seasons = available_seasons()
 
     if year in seasons:
-        tracks = get_tracks_from_df_for_season(year)
+        tracks = track_registry.season_tracks(year)
         next_round = get_next_track() if year == CURRENT_SEASON else SEASON_COMPLETE
     else:
         tracks = get_placeholder_current_season_tracks()
@@ -1,85 +1,53 @@
 import json
-import os
-import pandas as pd
-from flask import Blueprint, Response
-
-from ml.driver_strength_predictor import (
-    predict_driver_strengths,
-    RESULTS_PATH_DRIVERS,
-)
-from ml.gp_predictor import (
-    predict_gp_results,
-    RESULTS_PATH_GP
-)
-from ml.constructor_strength_predictor import (
-    predict_constructor_strengths,
-    RESULTS_PATH_CONSTRUCTORS,
-)
+from flask import Blueprint, Response, request, url_for
+
+from app.prediction_rebuild import RebuildInProgress, submit_train_job
+from app.prediction_store import prediction_store
 
 from metadata.driver_metadata import DRIVER_METADATA
+from metadata.driver_resolver import canonical_driver_id
 
 ml_bp = Blueprint("ml", __name__, url_prefix="/ml")
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-FINAL_DF_PATH = os.path.join(BASE_DIR, "..", "ml", "final_df.csv")
-
-try:
-    _FINAL_DF = pd.read_csv(FINAL_DF_PATH)
-except Exception:
-    _FINAL_DF = pd.DataFrame()
+MAX_BATCH_ROUNDS = 30
 
 
-@ml_bp.route("/<int:season>/<int:roundnum>")
-def get_ml_predictions(season, roundnum):
+def load_prediction_snapshot():
     try:
-        with open(RESULTS_PATH_GP, "r") as f:
-            gp_results_all = json.load(f)
-        with open(RESULTS_PATH_DRIVERS, "r") as f:
-            driver_strengths_all = json.load(f)
-        with open(RESULTS_PATH_CONSTRUCTORS, "r") as f:
-            constructor_strengths_all = json.load(f)
+        return prediction_store.get()
     except FileNotFoundError:
-        driver_strengths_all = predict_driver_strengths()
-        constructor_strengths_all = predict_constructor_strengths()
-        gp_results_all = predict_gp_results()
-
-        with open(RESULTS_PATH_GP, "w") as f:
-            json.dump(gp_results_all, f, indent=2)
-        with open(RESULTS_PATH_DRIVERS, "w") as f:
-            json.dump(driver_strengths_all, f, indent=2)
-        with open(RESULTS_PATH_CONSTRUCTORS, "w") as f:
-            json.dump(constructor_strengths_all, f, indent=2)
-    except json.JSONDecodeError:
-        return Response(response="[]", status=500, mimetype="application/json")
+        # Regenerated by a background retrain; the store picks the artifacts up on reload
+        job, _ = submit_train_job()
+        raise RebuildInProgress(job["id"]) from None
 
-    gp_result_for_round = next(
-        (s for s in gp_results_all if int(s.get("season", -1)) == season), None
-    )
-    if not gp_result_for_round:
-        return Response(response="[]", status=404, mimetype="application/json")
 
-    gp_result_for_round = next(
-        (r for r in gp_result_for_round.get("rounds", [])
-         if int(r.get("round", -1)) == roundnum),
-        None
+def rebuild_in_progress_response(e):
+    return Response(
+        response=json.dumps({
+            "status": "error",
+            "message": str(e),
+            "job_id": e.job_id,
+            "status_url": url_for("train.job_status", job_id=e.job_id),
+        }),
+        status=503,
+        mimetype="application/json",
+        headers={"Retry-After": str(e.retry_after)}
     )
+
+
+def build_round_payload(snapshot, season, roundnum):
+    gp_result_for_round = snapshot.gp_round(season, roundnum)
     if not gp_result_for_round:
-        return Response(response="[]", status=404, mimetype="application/json")
+        return None
 
     predictions = gp_result_for_round.get("predictions", [])
     drivers_in_round = {p.get("driver") for p in predictions if p.get("driver")}
-    drivers_in_round_lower = {d.lower() for d in drivers_in_round}
+    driver_ids_in_round = {canonical_driver_id(d) for d in drivers_in_round}
 
-    driver_strengths_for_round = []
-    for season_entry in driver_strengths_all:
-        if int(season_entry.get("season", -1)) != season:
-            continue
-        for rnd_entry in season_entry.get("rounds", []):
-            if int(rnd_entry.get("round", -1)) != roundnum:
-                continue
-            for ds in rnd_entry.get("predictions", []):
-                if not drivers_in_round or ds.get("driver", "").lower() in drivers_in_round_lower:
-                    driver_strengths_for_round.append(ds)
+    driver_strengths_for_round = [
+        ds for ds in snapshot.driver_strengths(season, roundnum)
+        if not drivers_in_round or canonical_driver_id(ds.get("driver")) in driver_ids_in_round
+    ]
 
     if not driver_strengths_for_round and drivers_in_round:
         for d in sorted(drivers_in_round):
@@ -94,52 +62,102 @@ def get_ml_predictions(season, roundnum):
                 "track_raw_score": None,
             })
 
-    constructor_strengths_for_round = []
-    for season_entry in constructor_strengths_all:
-        if int(season_entry.get("season", -1)) != season:
+    return {
+        "gp_results": gp_result_for_round,
+        "driver_strength": driver_strengths_for_round,
+        "constructor_strength": list(snapshot.constructor_strengths(season, roundnum)),
+    }
+
+
+def parse_rounds_param(raw):
+    # Accepts "4,5", "3-5" or a mix such as "1,3-5"
+    rounds = set()
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
             continue
-        for rnd_entry in season_entry.get("rounds", []):
-            if int(rnd_entry.get("round", -1)) != roundnum:
-                continue
-            constructor_strengths_for_round.extend(rnd_entry.get("predictions", []))
-
-    driver_extremes = {}
-    season_strengths = next(
-        (s for s in driver_strengths_all if int(s.get("season", -1)) == season),
-        None
-    )
-    if season_strengths:
-        all_rounds = []
-        for rnd_entry in season_strengths.get("rounds", []):
-            rnd = rnd_entry.get("round")
-            for ds in rnd_entry.get("predictions", []):
-                record = {
-                    "round": rnd,
-                    "driver": ds.get("driver"),
-                    "rating": ds.get("rating"),
-                    "track_id": ds.get("circuit_id") or ds.get("track_id")
-                }
-                all_rounds.append(record)
-
-        df_all = pd.DataFrame(all_rounds)
-        if not df_all.empty:
-            for driver, sub in df_all.groupby("driver"):
-                sub_sorted = sub.sort_values("rating", ascending=False)
-
-                top5 = sub_sorted.head(5).to_dict(orient="records")
-                bottom5 = sub_sorted.tail(5).sort_values("rating", ascending=True).to_dict(orient="records")
-
-                driver_extremes[driver] = {
-                    "best_rounds": top5,
-                    "worst_rounds": bottom5
-                }
+        if "-" in part:
+            lo, hi = sorted(int(x) for x in part.split("-", 1))
+            if hi - lo >= MAX_BATCH_ROUNDS:
+                raise ValueError(f"Round range {part} is too large")
+            rounds.update(range(lo, hi + 1))
+        else:
+            rounds.add(int(part))
+        if len(rounds) > MAX_BATCH_ROUNDS:
+            raise ValueError(f"At most {MAX_BATCH_ROUNDS} rounds per request")
+    return sorted(rounds)
+
+
+def _numeric(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else float("-inf")
+
+
+def _with_changes(entries, prev_entries, name_key, value_key, change_key, ranked, digits):
+    # Previous positions follow the same ordering the track page renders
+    def order(items):
+        if not ranked:
+            return list(items)
+        return sorted(items, key=lambda e: -_numeric(e.get(value_key)))
+
+    prev_positions = {}
+    prev_values = {}
+    for idx, e in enumerate(order(prev_entries or [])):
+        name = str(e.get(name_key) or "").lower()
+        if name:
+            prev_positions[name] = idx + 1
+            prev_values[name] = e.get(value_key)
+
+    out = []
+    for e in entries:
+        name = str(e.get(name_key) or "").lower()
+        value, prev_value = e.get(value_key), prev_values.get(name)
+        change = None
+        if isinstance(value, (int, float)) and isinstance(prev_value, (int, float)):
+            change = round(float(value) - float(prev_value), digits)
+        out.append({**e, "previous_position": prev_positions.get(name), change_key: change})
+    return out
+
+
+def add_round_changes(current, previous):
+    prev = previous or {}
+    prev_gp = (prev.get("gp_results") or {}).get("predictions")
+    return {
+        "gp_results": {
+            **current["gp_results"],
+            "predictions": _with_changes(
+                current["gp_results"].get("predictions", []), prev_gp,
+                "driver", "probability", "probability_change", ranked=False, digits=2,
+            ),
+        },
+        "driver_strength": _with_changes(
+            current["driver_strength"], prev.get("driver_strength"),
+            "driver", "rating", "rating_change", ranked=True, digits=1,
+        ),
+        "constructor_strength": _with_changes(
+            current["constructor_strength"], prev.get("constructor_strength"),
+            "TEAM", "predicted_strength", "strength_change", ranked=True, digits=4,
+        ),
+        "has_previous": previous is not None,
+    }
+
+
+@ml_bp.route("/<int:season>/<int:roundnum>")
+def get_ml_predictions(season, roundnum):
+    try:
+        snapshot = load_prediction_snapshot()
+    except json.JSONDecodeError:
+        return Response(response="[]", status=500, mimetype="application/json")
+    except RebuildInProgress as e:
+        return rebuild_in_progress_response(e)
+
+    round_payload = build_round_payload(snapshot, season, roundnum)
+    if not round_payload:
+        return Response(response="[]", status=404, mimetype="application/json")
 
     response_data = {
-        "gp_results": gp_result_for_round,
-        "driver_strength": driver_strengths_for_round,
-        "constructor_strength": constructor_strengths_for_round,
+        **round_payload,
         "driver_metadata": DRIVER_METADATA,
-        "driver_extremes": driver_extremes,
+        "driver_extremes": snapshot.driver_extremes(season),
     }
 
     return Response(
@@ -147,3 +165,45 @@ def get_ml_predictions(season, roundnum):
         status=200,
         mimetype="application/json"
     )
+
+
+# Several rounds of one season in a single response, e.g. ?rounds=4,5 or ?rounds=3-6.
+# Every round carries position/value changes against the round before it.
+@ml_bp.route("/<int:season>")
+def get_ml_predictions_batch(season):
+    try:
+        snapshot = load_prediction_snapshot()
+    except json.JSONDecodeError:
+        return Response(response="[]", status=500, mimetype="application/json")
+    except RebuildInProgress as e:
+        return rebuild_in_progress_response(e)
+
+    raw_rounds = request.args.get("rounds")
+    try:
+        rounds = parse_rounds_param(raw_rounds) if raw_rounds else snapshot.season_rounds(season)
+    except ValueError:
+        return Response(response="[]", status=400, mimetype="application/json")
+
+    rounds_data = {}
+    for roundnum in rounds:
+        current = build_round_payload(snapshot, season, roundnum)
+        if not current:
+            continue
+        previous = build_round_payload(snapshot, season, roundnum - 1) if roundnum > 1 else None
+        rounds_data[str(roundnum)] = add_round_changes(current, previous)
+
+    if not rounds_data:
+        return Response(response="[]", status=404, mimetype="application/json")
+
+    response_data = {
+        "season": season,
+        "rounds": rounds_data,
+        "driver_metadata": DRIVER_METADATA,
+        "driver_extremes": snapshot.driver_extremes(season),
+    }
+
+    return Response(
+        response=json.dumps(response_data),
+        status=200,
+        mimetype="application/json"
+    )
@@ -1,22 +1,14 @@
-import os
-import pandas as pd
 from flask import Blueprint, render_template, redirect, url_for
 from metadata.track_metadata import TRACK_METADATA
-from typing import Any
+from app.dataset_service import dataset_service
+from app.track_registry import build_track_from_key, track_key_for_url_name, track_registry
 
 tracks_bp = Blueprint("tracks", __name__, url_prefix="/tracks")
 
 CURRENT_SEASON = 2025
 MIN_SEASON = 2010
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-FINAL_DF_PATH = os.path.join(BASE_DIR, "ml", "final_df.csv")
 SEASON_COMPLETE = -1
 
-try:
-    _FINAL_DF = pd.read_csv(FINAL_DF_PATH)
-except Exception as e:
-    _FINAL_DF = pd.DataFrame()
-
 def build_f1_url(track_meta, season):
     race_ids = track_meta.get("race_ids", {})
     if season not in race_ids:
@@ -26,26 +18,7 @@ def build_f1_url(track_meta, season):
     return f"https://www.formula1.com/en/results/{season}/races/{race_id}/{url_name}/race-result"
 
 def available_seasons():
-    if _FINAL_DF.empty:
-        return []
-    seasons = sorted(_FINAL_DF['season'].dropna().astype(int).unique().tolist())
-    return [s for s in seasons if s >= MIN_SEASON]
-
-def build_track_from_key(key, round_num=None):
-    meta = TRACK_METADATA.get(key, {})
-    return {
-        "id": key,
-        "display_name": meta.get("display_name", key.replace('_', ' ').title()),
-        "layout": meta.get("layout", ""),
-        "flag": meta.get("flag", ""),
-        "detailed_flag": meta.get("detailed_flag", ""),
-        "annotated_layout": meta.get("annotated_layout", ""),
-        "detailed_track_image": meta.get("detailed_track_image", ""),
-        "detailed_track_attribution": meta.get("detailed_track_attribution", ""),
-        "round": int(round_num) if round_num is not None else meta.get("round"),
-        "wiki": meta.get("wiki", ""),
-        "date": meta.get("date", "")
-    }
+    return [s for s in dataset_service.get().seasons if s >= MIN_SEASON]
 
 def get_placeholder_current_season_tracks():
     tracklist = []
@@ -55,78 +28,6 @@ def get_placeholder_current_season_tracks():
     tracklist.sort(key=lambda x: (x.get('round') if x.get('round') is not None else 999))
     return tracklist
 
-# build tracklist for a past season from final_df
-def get_tracks_from_df_for_season(year: int):
-    if _FINAL_DF.empty:
-        return []
-
-    df_year = _FINAL_DF[_FINAL_DF['season'] == int(year)]
-    if df_year.empty:
-        return []
-
-    if 'round' in df_year.columns:
-        df_year = df_year.sort_values('round').drop_duplicates(subset=['round'])
-    else:
-        df_year = df_year.reset_index(drop=True)
-
-    tracks = []
-
-    for _, row in df_year.iterrows():
-        try:
-            round_num = int(row['round'])
-        except (TypeError, ValueError):
-            continue
-
-        key = None
-        for track_key, meta in TRACK_METADATA.items():
-            circuit_col = meta.get("circuit_id")
-            if isinstance(circuit_col, str) and circuit_col in row.index:
-                val = row[circuit_col]
-                if pd.notna(val) and int(val) == 1:
-                    key = track_key
-                    break
-
-        if key:
-            t = build_track_from_key(key, round_num)
-            tracks.append(t)
-        else:
-            circuit_col_name = None
-            for col in row.index:
-                if not col.startswith("circuit_id_"):
-                    continue
-
-                value: Any = row.get(col)
-                if pd.isna(value):
-                    continue
-
-                try:
-                    if int(value) == 1:
-                        circuit_col_name = col[len("circuit_id_"):]
-                        break
-                except (TypeError, ValueError):
-                    continue
-
-            placeholder_id = circuit_col_name.replace('_', '-') if circuit_col_name else f"round-{round_num}"
-            placeholder_display_name = circuit_col_name.replace('_', ' ').title() if circuit_col_name else f"Round {round_num}"
-
-            placeholder = {
-                "id": placeholder_id,
-                "display_name": placeholder_display_name,
-                "f1_website": build_f1_url(1, 2024),
-                "flag": "Flag_of_Placeholder.png",
-                "detailed_flag": "Placeholder.png",
-                "annotated_layout": "placeholder.avif",
-                "layout": "placeholder.png",
-                "detailed_track_image": "placeholder_detailed_track.jpg",
-                "detailed_track_attribution": "",
-                "round": round_num,
-                "wiki": "",
-                "date": "1st January",
-            }
-            tracks.append(placeholder)
-
-    return tracks
-
 # Render individual track pages if they exist
 @tracks_bp.route("/<int:season>/<int:roundnum>/<trackname>")
 def tracks(season, roundnum, trackname):
@@ -136,11 +37,11 @@ def tracks(season, roundnum, trackname):
     seasons = available_seasons()
 
     if season in seasons:
-        tracks = get_tracks_from_df_for_season(season)
+        tracks = track_registry.season_tracks(season, with_dates=False)
     else:
         tracks = get_placeholder_current_season_tracks()
 
-    track = TRACK_METADATA.get(trackname)
+    track = TRACK_METADATA.get(trackname) or TRACK_METADATA.get(track_key_for_url_name(trackname))
     if not track:
         return render_template("homepage.html")
 
@@ -1,52 +1,65 @@
 import json
 import os
-from flask import Blueprint, Response
+from flask import Blueprint, Response, url_for
 
-from ml.driver_strength_predictor import predict_driver_strengths
-from ml.constructor_strength_predictor import predict_constructor_strengths
-from ml.gp_predictor import predict_gp_results
+from app.job_queue import job_queue
+from app.prediction_rebuild import PREDICTION_STAGES, submit_train_job
 from ml.current_season_gen import regenerate_dataframe
+from ml.pipeline import run_prediction_pipeline
 
 train_bp = Blueprint("train", __name__, url_prefix="/ml")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FINAL_DF_PATH = os.path.join(BASE_DIR, "..", "ml", "final_df.csv")
 
+# =======================
+# JOBS
+# =======================
+def regenerate_job(progress):
+    progress("dataframe", "running")
+    try:
+        regenerate_dataframe()
+    except Exception:
+        progress("dataframe", "failed")
+        raise
+    progress("dataframe", "done")
+
+    # Retrain ML predictions; driver strengths only redo rounds whose inputs changed
+    _, timings = run_prediction_pipeline(on_stage=progress)
+    return {"timings": timings}
+
+def job_response(job, created, message):
+    return Response(
+        response=json.dumps({
+            "status": job["status"],
+            "message": message if created else "A job of this kind is already in progress",
+            "job_id": job["id"],
+            "status_url": url_for("train.job_status", job_id=job["id"]),
+        }, indent=2),
+        status=202,
+        mimetype="application/json"
+    )
+
+# =======================
+# ROUTES
+# =======================
 @train_bp.route("/train")
 def run_ml_training():
-    driver_strengths = predict_driver_strengths()
-    constructor_strengths = predict_constructor_strengths()
-    gp_results = predict_gp_results()
-    return Response(response=json.dumps({
-        "driver_strengths": driver_strengths,
-        "constructor_strengths": constructor_strengths,
-        "gp_results": gp_results
-    }, indent=2), status=200, mimetype='application/json')
+    job, created = submit_train_job()
+    return job_response(job, created, "Queued ML retraining")
 
 @train_bp.route("/df")
 def run_current_season_gen():
-    try:
-        regenerate_dataframe()
-
-        # Retrain ML predictions
-        driver_strengths = predict_driver_strengths()
-        constructor_strengths = predict_constructor_strengths()
-        gp_results = predict_gp_results()
+    job, created = job_queue.submit("df", ["dataframe"] + PREDICTION_STAGES, regenerate_job)
+    return job_response(job, created, "Queued dataframe regeneration and ML retraining")
 
+@train_bp.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
         return Response(
-            response=json.dumps({
-                "status": "success",
-                "message": "Regenerated dataframe and retrained ML predictions",
-                "driver_strengths": driver_strengths,
-                "constructor_strengths": constructor_strengths,
-                "gp_results": gp_results
-            }, indent=2),
-            status=200,
+            response=json.dumps({"status": "error", "message": f"Unknown job {job_id}"}),
+            status=404,
             mimetype="application/json"
         )
-    except Exception as e:
-        return Response(
-            response=json.dumps({"status": "error", "message": str(e)}),
-            status=500,
-            mimetype="application/json"
-        )
\ No newline at end of file
+    return Response(response=json.dumps(job, indent=2), status=200, mimetype="application/json")
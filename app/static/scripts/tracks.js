@@ -97,55 +97,44 @@ document.addEventListener("DOMContentLoaded", async function () {
         return;
     }
 
-    // fetch current round data
+    // fetch current round data; previous-round changes are computed server-side
     let currentData;
     try {
-        const resp = await fetch(`/ml/${season}/${round}`);
+        const resp = await fetch(`/ml/${season}?rounds=${round}`);
         if (!resp.ok) throw new Error(`Failed to fetch predictions: ${resp.status}`);
-        currentData = await resp.json();
+        const batch = await resp.json();
+        const roundData = batch.rounds && batch.rounds[String(round)];
+        if (!roundData) throw new Error(`Missing predictions for round ${round}`);
+        currentData = {
+            ...roundData,
+            driver_metadata: batch.driver_metadata,
+            driver_extremes: batch.driver_extremes
+        };
     } catch (err) {
         console.error('Error fetching current round predictions:', err);
         return;
     }
 
-    // fetch previous round data
-    let prevData = null;
-    if (round > 1) {
-        try {
-            const respPrev = await fetch(`/ml/${season}/${round - 1}`);
-            if (respPrev.ok) {
-                prevData = await respPrev.json();
-            } else {
-                prevData = null;
-            }
-        } catch (err) {
-            prevData = null;
-        }
-    }
+    const prevExists = currentData.has_previous === true;
 
     const metadata = currentData.driver_metadata || {};
 
     if (!currentData.gp_results || !Array.isArray(currentData.gp_results.predictions)) {
         console.error("Invalid or missing gp_results.predictions");
     } else {
-        const prevGpPreds = prevData && prevData.gp_results && Array.isArray(prevData.gp_results.predictions)
-            ? prevData.gp_results.predictions
-            : null;
-        populateGPResults(currentData.gp_results.predictions, metadata, prevGpPreds, round, seasonAttr);
+        populateGPResults(currentData.gp_results.predictions, metadata, prevExists, round, seasonAttr);
     }
 
     if (!Array.isArray(currentData.driver_strength)) {
         console.error("Invalid or missing driver_strength array");
     } else {
-        const prevDrivers = prevData && Array.isArray(prevData.driver_strength) ? prevData.driver_strength : null;
-        populateDriverStrength(currentData.driver_strength, metadata, prevDrivers, round, seasonAttr);
+        populateDriverStrength(currentData.driver_strength, metadata, prevExists, round, seasonAttr);
     }
 
     if (!Array.isArray(currentData.constructor_strength)) {
         console.error("Invalid or missing constructor_strength array");
     } else {
-        const prevConstructors = prevData && Array.isArray(prevData.constructor_strength) ? prevData.constructor_strength : null;
-        populateConstructorStrength(currentData.constructor_strength, prevConstructors, round, seasonAttr);
+        populateConstructorStrength(currentData.constructor_strength, prevExists, round, seasonAttr);
     }
 
     window.driverDataMap = {};
@@ -506,22 +495,13 @@ function createPredictionItem(
 
 /* ---------- Population functions with change detection ---------- */
 
-function populateGPResults(predictions, metadata, prevPredictions, roundNum, season) {
+function populateGPResults(predictions, metadata, prevExists, roundNum, season) {
     const list = document.querySelector('.gp-results');
     if (!list) return;
 
     list.innerHTML = '';
     hideSpinnerForList('.gp-results');
 
-    const prevExists = Array.isArray(prevPredictions);
-    const prevMap = {};
-    if (prevExists) {
-        prevPredictions.forEach((p, idx) => {
-            const key = (p.driver || '').toLowerCase();
-            if (key) prevMap[key] = idx + 1;
-        });
-    }
-
     predictions.forEach((driver, index) => {
         const key = (driver.driver || '').toLowerCase();
         const meta = metadata[key] || {};
@@ -535,7 +515,7 @@ function populateGPResults(predictions, metadata, prevPredictions, roundNum, sea
         const probability = `${probabilityValue}%`;
 
         const currentPos = index + 1;
-        const prevPos = prevMap[key] !== undefined ? prevMap[key] : null;
+        const prevPos = driver.previous_position ?? null;
         const changeType = computeChangeType(currentPos, prevPos, prevExists, roundNum);
 
         driverDataMap[key] = driverDataMap[key] || {};
@@ -554,7 +534,7 @@ function populateGPResults(predictions, metadata, prevPredictions, roundNum, sea
     window.driverDataMap = driverDataMap;
 }
 
-function populateDriverStrength(drivers, metadata, prevDrivers, roundNum, season) {
+function populateDriverStrength(drivers, metadata, prevExists, roundNum, season) {
     const list = document.querySelector('.driver-list');
     if (!list) return;
 
@@ -567,20 +547,6 @@ function populateDriverStrength(drivers, metadata, prevDrivers, roundNum, season
         return vb - va;
     });
 
-    const prevExists = Array.isArray(prevDrivers);
-    const prevMap = {};
-    if (prevExists) {
-        const prevSorted = prevDrivers.slice().sort((a, b) => {
-            const va = (a && (typeof a.rating === 'number' ? a.rating : Number(a.rating || a.strength || -Infinity)));
-            const vb = (b && (typeof b.rating === 'number' ? b.rating : Number(b.rating || b.strength || -Infinity)));
-            return vb - va;
-        });
-        prevSorted.forEach((d, idx) => {
-            const k = (d.driver || '').toLowerCase();
-            if (k) prevMap[k] = idx + 1;
-        });
-    }
-
     sorted.forEach((d, index) => {
         const driverNameRaw = d.driver || d.Driver || '';
         const key = (driverNameRaw || '').toLowerCase();
@@ -601,7 +567,7 @@ function populateDriverStrength(drivers, metadata, prevDrivers, roundNum, season
             : 'N/A';
 
         const currentPos = index + 1;
-        const prevPos = prevMap[key] !== undefined ? prevMap[key] : null;
+        const prevPos = d.previous_position ?? null;
         const changeType = computeChangeType(currentPos, prevPos, prevExists, roundNum);
 
         driverDataMap[key] = driverDataMap[key] || {};
@@ -914,7 +880,7 @@ function createMetricBadge(metricValue) {
   window.closeDriverModal = window.closeDriverModal || closeModal;
 })();
 
-function populateConstructorStrength(constructors, prevConstructors, roundNum, season) {
+function populateConstructorStrength(constructors, prevExists, roundNum, season) {
     const list = document.querySelector('.constructor-list');
     if (!list) return;
 
@@ -933,21 +899,6 @@ function populateConstructorStrength(constructors, prevConstructors, roundNum, s
         return vb - va;
     });
 
-    const prevExists = Array.isArray(prevConstructors);
-    const prevMap = {};
-    if (prevExists) {
-        const prevSorted = prevConstructors.slice().sort((a, b) => {
-            const va = (a && typeof a.predicted_strength === 'number') ? a.predicted_strength : -Infinity;
-            const vb = (b && typeof b.predicted_strength === 'number') ? b.predicted_strength : -Infinity;
-            return vb - va;
-        });
-        prevSorted.forEach((c, idx) => {
-            const raw = c.TEAM || c.constructor || c.team || '';
-            const n = raw || 'Unknown';
-            prevMap[n.toLowerCase()] = idx + 1;
-        });
-    }
-
     sorted.forEach((constructor, index) => {
         const rawName = constructor.TEAM || constructor.constructor || constructor.team || 'Unknown';
         const name = capitalize(rawName);
@@ -959,7 +910,7 @@ function populateConstructorStrength(constructors, prevConstructors, roundNum, s
         }
 
         const currentPos = index + 1;
-        const prevPos = prevMap[name.toLowerCase()] !== undefined ? prevMap[name.toLowerCase()] : null;
+        const prevPos = constructor.previous_position ?? null;
         const changeType = computeChangeType(currentPos, prevPos, prevExists, roundNum);
 
         driverDataMap[key] = driverDataMap[key] || {};
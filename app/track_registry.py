@@ -0,0 +1,125 @@
+import threading
+from datetime import datetime
+
+from metadata.track_metadata import TRACK_METADATA
+from app.dataset_service import dataset_service
+
+# First entry wins, matching the TRACK_METADATA iteration order
+CIRCUIT_COLUMN_TO_KEY = {}
+URL_NAME_TO_KEY = {}
+for _key, _meta in TRACK_METADATA.items():
+    if isinstance(_meta.get("circuit_id"), str):
+        CIRCUIT_COLUMN_TO_KEY.setdefault(_meta["circuit_id"], _key)
+    if isinstance(_meta.get("url_name"), str):
+        URL_NAME_TO_KEY.setdefault(_meta["url_name"], _key)
+
+
+def track_key_for_circuit(circuit):
+    if not circuit:
+        return None
+    return CIRCUIT_COLUMN_TO_KEY.get(f"circuit_id_{circuit}")
+
+
+def track_key_for_url_name(url_name):
+    return URL_NAME_TO_KEY.get(url_name)
+
+
+def day_with_suffix(day: int) -> str:
+    if 11 <= day <= 13:
+        return f"{day}th"
+    last_digit = day % 10
+    if last_digit == 1:
+        return f"{day}st"
+    elif last_digit == 2:
+        return f"{day}nd"
+    elif last_digit == 3:
+        return f"{day}rd"
+    else:
+        return f"{day}th"
+
+
+def build_track_from_key(key, round_num=None, track_date=None):
+    meta = TRACK_METADATA.get(key, {})
+    formatted_date = ""
+    if track_date is not None:
+        try:
+            dt = datetime.strptime(track_date, "%Y-%m-%d")
+            formatted_date = f"{day_with_suffix(dt.day)} {dt.strftime('%B')}"
+        except Exception:
+            formatted_date = track_date
+
+    return {
+        "id": key,
+        "display_name": meta.get("display_name", key.replace('_', ' ').title()),
+        "layout": meta.get("layout", ""),
+        "flag": meta.get("flag", ""),
+        "detailed_flag": meta.get("detailed_flag", ""),
+        "annotated_layout": meta.get("annotated_layout", ""),
+        "detailed_track_image": meta.get("detailed_track_image", ""),
+        "detailed_track_attribution": meta.get("detailed_track_attribution", ""),
+        "round": int(round_num) if round_num is not None else meta.get("round"),
+        "wiki": meta.get("wiki", ""),
+        "date": formatted_date if formatted_date else meta.get("date", "")
+    }
+
+
+def build_placeholder_track(circuit, round_num):
+    return {
+        "id": circuit.replace('_', '-') if circuit else f"round-{round_num}",
+        "display_name": circuit.replace('_', ' ').title() if circuit else f"Round {round_num}",
+        "f1_website": "2024/united-arab-emirates",
+        "flag": "Flag_of_Placeholder.png",
+        "detailed_flag": "Placeholder.png",
+        "annotated_layout": "placeholder.avif",
+        "layout": "placeholder.png",
+        "detailed_track_image": "placeholder_detailed_track.jpg",
+        "detailed_track_attribution": "",
+        "round": round_num,
+        "wiki": "",
+        "date": "1st January",
+    }
+
+
+class TrackRegistry:
+    """Per-season track lists built from the dataset calendar and memoized
+    until the dataset reloads. Returned lists and dicts are shared; callers
+    must not mutate them.
+    """
+
+    def __init__(self, service=dataset_service):
+        self.service = service
+        self._lock = threading.Lock()
+        # (dataset snapshot, {(season, with_dates): [track, ...]})
+        self._state = (None, {})
+
+    def _memo(self):
+        snapshot = self.service.get()
+        cached_snapshot, memo = self._state
+        if cached_snapshot is not snapshot:
+            with self._lock:
+                cached_snapshot, memo = self._state
+                if cached_snapshot is not snapshot:
+                    memo = {}
+                    self._state = (snapshot, memo)
+        return snapshot, memo
+
+    def _build_season_tracks(self, snapshot, season, with_dates):
+        tracks = []
+        for entry in snapshot.calendar.get(season, []):
+            key = track_key_for_circuit(entry["circuit"])
+            if key:
+                track_date = entry["date"] if with_dates else None
+                tracks.append(build_track_from_key(key, entry["round"], track_date))
+            else:
+                tracks.append(build_placeholder_track(entry["circuit"], entry["round"]))
+        return tracks
+
+    def season_tracks(self, season, with_dates=True):
+        snapshot, memo = self._memo()
+        cache_key = (int(season), with_dates)
+        if cache_key not in memo:
+            memo[cache_key] = self._build_season_tracks(snapshot, int(season), with_dates)
+        return memo[cache_key]
+
+
+track_registry = TrackRegistry()
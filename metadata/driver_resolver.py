@@ -0,0 +1,59 @@
+import re
+from functools import lru_cache
+
+from metadata.driver_metadata import DRIVER_METADATA
+
+UNKNOWN_NAME_CACHE_SIZE = 2048
+
+_NON_ID_CHARS = re.compile(r'[^a-z0-9_]+')
+
+
+class DriverResolver:
+    """Maps raw driver names from the datasets onto DRIVER_METADATA keys.
+
+    Known ids resolve with a single dict lookup; anything else goes through the
+    sanitized / full-name indexes once and is then memoized.
+    """
+
+    def __init__(self, metadata, cache_size=UNKNOWN_NAME_CACHE_SIZE):
+        self.metadata = metadata
+
+        # First entry wins, matching the metadata iteration order
+        self.by_full_name = {}
+        for k, v in metadata.items():
+            full = v.get('full_name', '')
+            if isinstance(full, str):
+                self.by_full_name.setdefault(full.lower(), k)
+
+        self.by_spaced_key = {}
+        for k in metadata.keys():
+            self.by_spaced_key.setdefault(k.replace('_', ' ').lower(), k)
+
+        self._resolve_miss = lru_cache(maxsize=cache_size)(self._resolve_uncached)
+
+    def resolve(self, raw_name):
+        if not raw_name:
+            return None
+        lower = str(raw_name).strip().lower()
+        if lower in self.metadata:
+            return lower
+        return self._resolve_miss(lower)
+
+    def _resolve_uncached(self, lower):
+        sanitized = _NON_ID_CHARS.sub('_', lower).strip('_')
+        if sanitized in self.metadata:
+            return sanitized
+
+        if lower in self.by_full_name:
+            return self.by_full_name[lower]
+
+        if lower in self.by_spaced_key:
+            return self.by_spaced_key[lower]
+
+        return sanitized or lower
+
+
+driver_resolver = DriverResolver(DRIVER_METADATA)
+
+def canonical_driver_id(raw_name):
+    return driver_resolver.resolve(raw_name)
@@ -0,0 +1,37 @@
+import json
+import os
+import tempfile
+
+# Mode a plain open(path, 'w') would create files with under this process's
+# umask; mkstemp always creates 0600. Read once at import, since os.umask is
+# process-wide and changing it while other threads create files is unsafe.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+# =======================
+# ATOMIC ARTIFACT WRITES
+# =======================
+# Artifacts are written to a temp file in the same directory and renamed over
+# the target, so a reader sees either the old file or the new one, never a
+# partial write.
+
+def write_atomic(path, write, binary=False):
+    """Call `write(f)` on a temp file, then rename it to `path`."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if binary else "w") as f:
+            write(f)
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_text_atomic(path, text):
+    write_atomic(path, lambda f: f.write(text))
+
+def write_json_atomic(path, data, **dump_kwargs):
+    write_atomic(path, lambda f: json.dump(data, f, **dump_kwargs))
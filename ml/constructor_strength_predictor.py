@@ -1,95 +1,220 @@
-import json
 import os
 import pandas as pd
 import numpy as np
 from lightgbm import LGBMRegressor
 
+from ml.artifacts import write_json_atomic
+from ml.dataset import entity_vocabulary, load_final_df
+from ml.model_cache import (
+    MODEL_CACHE_DIR, cached_model_path, load_cached_model, save_cached_model, training_slice_digest,
+)
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 RESULTS_PATH_CONSTRUCTORS = os.path.join(BASE_DIR, "constructor_strengths.json")
 FINAL_DF_PATH = os.path.join(BASE_DIR, "final_df.csv")
 
-# =============================
-# CONSTRUCTOR STRENGTH PREDICTION
-# =============================
-def predict_constructor_strengths(start_year: int = 2010, end_year: int = 2025):
-    print(f"Training and predicting constructor strengths from {start_year} to {end_year}...")
+CONSTRUCTOR_MODEL_CACHE_DIR = MODEL_CACHE_DIR
 
-    df = pd.read_csv(FINAL_DF_PATH)
+CONSTRUCTOR_MODEL_NAME = "constructor"
+# Part of the cache key: changing the model setup forces a refit
+CONSTRUCTOR_MODEL_CONFIG = "LGBMRegressor(n_estimators=500,learning_rate=0.05,max_depth=6,random_state=42)"
 
-    constructor_cols = [c for c in df.columns if c.startswith("constructor_")]
-    onehot_cols = []
-    for col in constructor_cols:
-        vals = df[col].dropna().unique()
-        try:
-            is_binary = all((v in (0, 1, 0.0, 1.0, True, False)) for v in vals)
-        except Exception:
-            is_binary = False
-        if is_binary:
-            onehot_cols.append(col)
+SEASON_DECAY = 1.0
+ROUND_DECAY = 0.8
 
-    if not onehot_cols:
-        raise RuntimeError("No one-hot constructor columns detected. Aborting — check column names.")
+FORM_COLUMNS = ['avg_pos', 'best_pos', 'points_score', 'both_scored_flag', 'track_strength']
 
-    mask = (df[onehot_cols] == 1)
-    idx = mask.idxmax(axis=1)
-    no_team_rows = mask.sum(axis=1) == 0
-    idx[no_team_rows] = None
-    df['TEAM'] = idx.str.replace("constructor_", "", regex=False)
-    df = df[df['TEAM'].notna()].copy()
-
-    circuit_cols = [c for c in df.columns if c.startswith("circuit_id_")]
-    if not circuit_cols:
-        raise RuntimeError("No circuit_id_* columns found.")
-
-    def get_circuit_name(row):
-        true_cols = [c for c in circuit_cols if row.get(c, 0) == 1]
-        if len(true_cols) == 1:
-            return true_cols[0].replace("circuit_id_", "")
-        elif len(true_cols) == 0:
-            return np.nan
+# =============================
+# ROLLING FORM ENGINE
+# =============================
+# Features for (team, season, round) only look at that team's earlier
+# rounds. Instead of re-filtering the history per query, one chronological
+# pass keeps per-team decayed sums and per-(team, circuit) strength sums.
+#
+# A past round at (s, r) weighs exp(-SEASON_DECAY * (S - s) - ROUND_DECAY * (R - r))
+# when queried at (S, R). Rescaling a team's sums by the same factor when a
+# newer round is added keeps them relative to its latest round; the common
+# factor cancels in the weighted averages.
+
+def _form_kernel(h_team, h_circuit, h_season, h_round, h_avg, h_best, h_points, h_both, h_strength,
+                 q_team, q_circuit, q_season, q_round, n_teams, n_circuits, season_decay, round_decay):
+    out = np.full((len(q_team), 5), np.nan)
+
+    count = np.zeros(n_teams, dtype=np.int64)
+    ref_season = np.zeros(n_teams)
+    ref_round = np.zeros(n_teams)
+    w_sum = np.zeros(n_teams)
+    avg_sum = np.zeros(n_teams)
+    points_sum = np.zeros(n_teams)
+    both_sum = np.zeros(n_teams)
+    best = np.full(n_teams, np.nan)
+    track_sum = np.zeros((n_teams, n_circuits))
+    track_n = np.zeros((n_teams, n_circuits), dtype=np.int64)
+
+    h = 0
+    for q in range(len(q_team)):
+        S = q_season[q]
+        R = q_round[q]
+        # Fold in every round strictly before (S, R)
+        while h < len(h_team) and (h_season[h] < S or (h_season[h] == S and h_round[h] < R)):
+            t = h_team[h]
+            if count[t] > 0:
+                f = np.exp(-season_decay * (h_season[h] - ref_season[t]) - round_decay * (h_round[h] - ref_round[t]))
+                w_sum[t] *= f
+                avg_sum[t] *= f
+                points_sum[t] *= f
+                both_sum[t] *= f
+            w_sum[t] += 1.0
+            avg_sum[t] += h_avg[h]
+            points_sum[t] += h_points[h]
+            both_sum[t] += h_both[h]
+            b = h_best[h]
+            if b == b and not (best[t] <= b):
+                best[t] = b
+            ref_season[t] = h_season[h]
+            ref_round[t] = h_round[h]
+            count[t] += 1
+
+            strength = h_strength[h]
+            if strength == strength:
+                track_sum[t, h_circuit[h]] += strength
+                track_n[t, h_circuit[h]] += 1
+            h += 1
+
+        t = q_team[q]
+        if count[t] > 0:
+            out[q, 0] = avg_sum[t] / w_sum[t]
+            out[q, 1] = best[t]
+            out[q, 2] = points_sum[t] / w_sum[t]
+            out[q, 3] = 1.0 if both_sum[t] / w_sum[t] > 0.5 else 0.0
         else:
-            return true_cols[0].replace("circuit_id_", "")
-
-    df['circuit'] = df.apply(get_circuit_name, axis=1)
-
-    def compute_constructor_strength(group):
-        avg_pos = group["podium"].mean()
-        best_pos = group["podium"].min()
-        max_points = df["constructor_points"].max() if "constructor_points" in df.columns else 1.0
-        points_score = group["constructor_points"].mean() / max_points if max_points != 0 else 0.0
-        drivers_in_points = (group["podium"] <= 10).sum()
-        both_scored_flag = 1 if drivers_in_points >= 2 else 0
-        avg_pos_score = (21 - avg_pos) / 20
-        best_pos_score = (21 - best_pos) / 20
-        strength = 0.4 * avg_pos_score + 0.3 * best_pos_score + 0.2 * points_score + 0.1 * both_scored_flag
-        return pd.Series({
-            "avg_pos": avg_pos,
-            "best_pos": best_pos,
-            "points_score": points_score,
-            "both_scored_flag": both_scored_flag,
-            "strength": strength
-        })
+            out[q, 3] = 0.0
+        c = q_circuit[q]
+        if track_n[t, c] > 0:
+            out[q, 4] = track_sum[t, c] / track_n[t, c]
+    return out
+
+try:
+    from numba import njit
+    _form_kernel = njit(cache=True)(_form_kernel)
+except ImportError:
+    # numba is optional; the kernel is a single linear pass either way
+    pass
+
+def form_features(hist, queries):
+    """FORM_COLUMNS for each (TEAM, circuit, season, round) row of `queries`.
+
+    `hist` is the per-(season, round, TEAM) strength table with a filled
+    circuit column. Results are aligned with `queries`.
+    """
+    teams, team_vocab = pd.factorize(pd.concat([hist['TEAM'], queries['TEAM']], ignore_index=True))
+    circuits, circuit_vocab = pd.factorize(pd.concat([hist['circuit'], queries['circuit']], ignore_index=True))
+    h_team, q_team = teams[:len(hist)], teams[len(hist):]
+    h_circuit, q_circuit = circuits[:len(hist)], circuits[len(hist):]
+
+    h_season = hist['season'].to_numpy(dtype=np.float64)
+    h_round = hist['round'].to_numpy(dtype=np.float64)
+    h_order = np.lexsort((h_round, h_season))
+    q_season = queries['season'].to_numpy(dtype=np.float64)
+    q_round = queries['round'].to_numpy(dtype=np.float64)
+    q_order = np.lexsort((q_round, q_season))
+
+    def column(name):
+        return hist[name].to_numpy(dtype=np.float64)[h_order]
+
+    out = _form_kernel(
+        h_team[h_order], h_circuit[h_order], h_season[h_order], h_round[h_order],
+        column('avg_pos'), column('best_pos'), column('points_score'), column('both_scored_flag'),
+        column('strength'),
+        q_team[q_order], q_circuit[q_order], q_season[q_order], q_round[q_order],
+        len(team_vocab), len(circuit_vocab), SEASON_DECAY, ROUND_DECAY,
+    )
+    features = np.empty_like(out)
+    features[q_order] = out
+    return pd.DataFrame(features, columns=FORM_COLUMNS, index=queries.index)
 
-    constructor_round_strength = (
-        df.groupby(["season", "round", "TEAM"], dropna=False)
-          .apply(compute_constructor_strength)
+# =============================
+# ROUND STRENGTH TABLE
+# =============================
+def constructor_round_strength_table(df):
+    """One row per (season, round, TEAM) with the round's strength and circuit.
+
+    Columns: season, round, TEAM, avg_pos, best_pos, points_score,
+    both_scored_flag, strength, circuit (the group's first known circuit).
+    """
+    max_points = df["constructor_points"].max()
+    grouped = (
+        df.assign(in_points=(df["podium"] <= 10).astype(int))
+          .groupby(["season", "round", "TEAM"], dropna=False)
+          .agg(
+              avg_pos=("podium", "mean"),
+              best_pos=("podium", "min"),
+              points_mean=("constructor_points", "mean"),
+              drivers_in_points=("in_points", "sum"),
+              circuit=("circuit", "first"),
+          )
           .reset_index()
     )
 
-    season_round_team_circuit = (
-        df[['season', 'round', 'TEAM', 'circuit']]
-        .drop_duplicates()
-        .groupby(['season','round','TEAM'], dropna=False)
-        .first()
-        .reset_index()
+    table = grouped[["season", "round", "TEAM"]].copy()
+    table["avg_pos"] = grouped["avg_pos"].astype(float)
+    table["best_pos"] = grouped["best_pos"].astype(float)
+    table["points_score"] = grouped["points_mean"] / max_points if max_points != 0 else 0.0
+    table["both_scored_flag"] = (grouped["drivers_in_points"] >= 2).astype(float)
+    avg_pos_score = (21 - table["avg_pos"]) / 20
+    best_pos_score = (21 - table["best_pos"]) / 20
+    table["strength"] = (
+        0.4 * avg_pos_score + 0.3 * best_pos_score + 0.2 * table["points_score"] + 0.1 * table["both_scored_flag"]
     )
+    table["circuit"] = grouped["circuit"]
+    return table
 
-    constructor_round_strength = constructor_round_strength.merge(
-        season_round_team_circuit,
-        on=['season', 'round', 'TEAM'],
-        how='left'
+# =============================
+# STRENGTH MODEL
+# =============================
+def fit_constructor_model(X_train, y_train, end_year):
+    """Cache entry {"columns", "model"} for the LightGBM model trained on seasons before `end_year`.
+
+    The fitted model is reused while the training slice hashes the same.
+    """
+    columns = list(X_train.columns)
+    digest = training_slice_digest(
+        columns, X_train.to_numpy(dtype=np.float64), y_train.to_numpy(), CONSTRUCTOR_MODEL_CONFIG
     )
+    path = cached_model_path(CONSTRUCTOR_MODEL_NAME, end_year, CONSTRUCTOR_MODEL_CACHE_DIR)
+    entry = load_cached_model(path, digest)
+    if entry is not None:
+        return entry
+
+    model = LGBMRegressor(n_estimators=500, learning_rate=0.05, max_depth=6, random_state=42)
+    model.fit(X_train, y_train)
+    try:
+        return save_cached_model(path, digest, columns=columns, model=model)
+    except OSError as e:
+        print(f"[WARN] Could not cache constructor model: {e}")
+        return {"training_sha256": digest, "columns": columns, "model": model}
+
+# =============================
+# CONSTRUCTOR STRENGTH PREDICTION
+# =============================
+def predict_constructor_strengths(start_year: int = 2010, end_year: int = 2025, df=None):
+    print(f"Training and predicting constructor strengths from {start_year} to {end_year}...")
+
+    df = load_final_df(FINAL_DF_PATH) if df is None else df.copy(deep=False)
+
+    if not entity_vocabulary(df.columns, "constructor"):
+        raise RuntimeError("No one-hot constructor columns detected. Aborting — check column names.")
+    if not entity_vocabulary(df.columns, "circuit"):
+        raise RuntimeError("No circuit_id_* columns found.")
+
+    # Team and circuit come straight from the dataset's entity codes
+    df['TEAM'] = df['constructor'].astype(object)
+    df = df[df['TEAM'].notna()].copy()
+    df['circuit'] = df['circuit'].astype(object)
+
+    constructor_round_strength = constructor_round_strength_table(df)
+    season_round_team_circuit = constructor_round_strength[['season', 'round', 'TEAM', 'circuit']]
 
     extra_cols = ['weather_warm','weather_cold','weather_dry','weather_wet','weather_cloudy']
     extra_cols = [c for c in extra_cols if c in df.columns]
@@ -124,102 +249,59 @@ def predict_constructor_strengths(start_year: int = 2010, end_year: int = 2025):
     if non_numeric:
         X_train = X_train.drop(columns=non_numeric)
 
-    model = LGBMRegressor(n_estimators=500, learning_rate=0.05, max_depth=6, random_state=42)
-    model.fit(X_train, y_train)
+    entry = fit_constructor_model(X_train, y_train, end_year)
+    model, model_columns = entry["model"], entry["columns"]
 
     hist = constructor_round_strength.copy()
     hist['circuit'] = hist['circuit'].fillna('unknown').astype(str)
 
-    SEASON_DECAY = 1.0
-    ROUND_DECAY = 0.8
-
-    def rolling_form(team, current_season, current_round):
-        past = hist[
-            (hist['TEAM'] == team) &
-            (
-                (hist['season'] < current_season) |
-                ((hist['season'] == current_season) & (hist['round'] < current_round))
-            )
-        ].copy()
-        if past.empty:
-            return {'avg_pos': np.nan, 'best_pos': np.nan, 'points_score': np.nan, 'both_scored_flag': 0}
-        past['season_weight'] = np.exp(-SEASON_DECAY * (current_season - past['season']))
-        past['round_weight'] = np.exp(-ROUND_DECAY * (current_round - past['round']))
-        past['total_weight'] = past['season_weight'] * past['round_weight']
-        return {
-            'avg_pos': np.average(past['avg_pos'], weights=past['total_weight']),
-            'best_pos': past.loc[past['best_pos'].idxmin(), 'best_pos'],
-            'points_score': np.average(past['points_score'], weights=past['total_weight']),
-            'both_scored_flag': int(np.average(past['both_scored_flag'], weights=past['total_weight']) > 0.5)
-        }
-
-    def track_strength(team, circuit, current_season, current_round):
-        past_track = hist[
-            (hist['TEAM'] == team) &
-            (hist['circuit'] == circuit) &
-            (
-                (hist['season'] < current_season) |
-                ((hist['season'] == current_season) & (hist['round'] < current_round))
-            )
-        ]
-        if past_track.empty:
-            return np.nan
-        return past_track['strength'].mean()
-
-    # === Loop across seasons ===
-    results = []
+    # === Queries: every team of each season at every round ===
+    query_rows = []
     for season in range(start_year, end_year + 1):
         teams = df.loc[df['season'] == season, 'TEAM'].dropna().unique()
         rounds = sorted(df.loc[df['season'] == season, 'round'].unique())
 
-        season_results = []
         for rnd in rounds:
-            rows = []
             round_circuits = season_round_team_circuit[
                 (season_round_team_circuit['season'] == season) & (season_round_team_circuit['round'] == rnd)
             ]['circuit'].dropna().unique()
             round_circuit = round_circuits[0] if len(round_circuits) > 0 else 'unknown'
 
             for team in teams:
-                rf = rolling_form(team, season, rnd)
-                ts = track_strength(team, round_circuit, season, rnd)
-                rows.append({
-                    'season': season,
-                    'round': rnd,
-                    'TEAM': team,
-                    'avg_pos': rf['avg_pos'],
-                    'best_pos': rf['best_pos'],
-                    'points_score': rf['points_score'],
-                    'both_scored_flag': rf['both_scored_flag'],
-                    'track_strength': ts,
-                    'circuit': round_circuit
-                })
-
-            rnd_df = pd.DataFrame(rows)
-
-            for col in ['avg_pos', 'best_pos', 'points_score', 'both_scored_flag', 'track_strength']:
-                if col in rnd_df.columns and rnd_df[col].isna().any():
-                    median_val = feature_df[col].median() if col in feature_df.columns else 0.0
-                    rnd_df[col].fillna(median_val, inplace=True)
-
-            X_round = pd.get_dummies(rnd_df.drop(columns=['season', 'round']), columns=['TEAM', 'circuit'], dtype=float)
-            X_round = X_round.reindex(columns=X_train.columns, fill_value=0)
-
-            preds = model.predict(X_round)
-            rnd_df['predicted_strength'] = preds
-
-            season_results.append({
-                "round": int(rnd),
-                "predictions": rnd_df[['TEAM','predicted_strength']].to_dict(orient="records")
-            })
-
+                query_rows.append({'season': season, 'round': rnd, 'TEAM': team, 'circuit': round_circuit})
+
+    queries = pd.DataFrame(query_rows, columns=['season', 'round', 'TEAM', 'circuit'])
+    queries = pd.concat([queries, form_features(hist, queries)], axis=1)
+    queries['both_scored_flag'] = queries['both_scored_flag'].astype(int)
+    queries = queries[['season', 'round', 'TEAM'] + FORM_COLUMNS + ['circuit']]
+
+    for col in FORM_COLUMNS:
+        if queries[col].isna().any():
+            median_val = feature_df[col].median() if col in feature_df.columns else 0.0
+            queries[col] = queries[col].fillna(median_val)
+
+    # === One design matrix and a single predict call for every query ===
+    X_queries = pd.get_dummies(queries.drop(columns=['season', 'round']), columns=['TEAM', 'circuit'], dtype=float)
+    X_queries = X_queries.reindex(columns=model_columns, fill_value=0)
+    queries['predicted_strength'] = model.predict(X_queries)
+
+    # === Assemble per season / round ===
+    query_groups = {
+        key: group[['TEAM', 'predicted_strength']]
+        for key, group in queries.groupby(['season', 'round'], sort=False, dropna=False)
+    }
+    results = []
+    for season in range(start_year, end_year + 1):
+        rounds = sorted(df.loc[df['season'] == season, 'round'].unique())
         results.append({
             "season": season,
-            "rounds": season_results
+            "rounds": [
+                {"round": int(rnd), "predictions": query_groups[(season, rnd)].to_dict(orient="records")}
+                for rnd in rounds
+            ]
         })
 
-    with open(RESULTS_PATH_CONSTRUCTORS, 'w') as f:
-        json.dump(results, f, indent=2)
+    write_json_atomic(RESULTS_PATH_CONSTRUCTORS, results, indent=2)
 
     print(f"Constructor strengths saved to {RESULTS_PATH_CONSTRUCTORS}")
     return results
\ No newline at end of file
@@ -11,6 +11,8 @@ from selenium.webdriver.common.by import By
 import numpy as np
 from dateutil.relativedelta import relativedelta
 
+from ml.dataset import save_final_df
+
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
 def regenerate_dataframe():
@@ -1049,6 +1051,7 @@ def regenerate_dataframe():
     full_df = pd.concat([full_df, season_2025_df], ignore_index=True)
 
     # Save the updated full dataframe
+    # CSV export plus the typed .npz bundle that readers load
     final_df_path = os.path.join(script_dir, "final_df.csv")
-    full_df.to_csv(final_df_path, index=False)
+    save_final_df(full_df, final_df_path)
     print(f"Updated full_df saved with {len(full_df)} total rows including 2025 season.")
\ No newline at end of file
@@ -0,0 +1,143 @@
+import os
+import numpy as np
+import pandas as pd
+
+from ml.artifacts import write_atomic
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FINAL_DF_PATH = os.path.join(BASE_DIR, "final_df.csv")
+
+ONEHOT_PREFIXES = ("circuit_id_", "nationality_", "constructor_")
+CONSTRUCTOR_STAT_COLS = ["constructor_wins", "constructor_points", "constructor_standings_pos"]
+
+# Categorical entity column -> one-hot prefix it is decoded from
+ENTITY_PREFIXES = {
+    "circuit": "circuit_id_",
+    "constructor": "constructor_",
+    "nationality": "nationality_",
+}
+
+# =======================
+# ENTITY CODES
+# =======================
+# Each one-hot block is carried as a single pandas Categorical column whose
+# categories (the vocabulary) are the one-hot column suffixes in column order,
+# e.g. df['constructor'] with categories ['alpine', 'aston_martin', ...].
+# Rows with no column set to 1 get a missing value. Being non-numeric, these
+# columns never leak into select_dtypes(np.number) feature matrices.
+
+def entity_columns(columns, entity):
+    prefix = ENTITY_PREFIXES[entity]
+    return [c for c in columns if c.startswith(prefix) and c not in CONSTRUCTOR_STAT_COLS]
+
+def entity_vocabulary(columns, entity):
+    prefix = ENTITY_PREFIXES[entity]
+    return [c[len(prefix):] for c in entity_columns(columns, entity)]
+
+def entity_codes(df, entity):
+    cols = entity_columns(df.columns, entity)
+    if not cols:
+        return np.full(len(df), -1, dtype=np.int16)
+    mask = (df[cols] == 1).to_numpy()
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), -1).astype(np.int16)
+
+def add_entity_columns(df, codes=None):
+    codes = codes or {}
+    for entity in ENTITY_PREFIXES:
+        entity_code = codes.get(entity)
+        if entity_code is None:
+            entity_code = entity_codes(df, entity)
+        df[entity] = pd.Categorical.from_codes(entity_code, categories=entity_vocabulary(df.columns, entity))
+    return df
+
+def constructor_display_name(constructor):
+    if not isinstance(constructor, str):
+        return None
+    return constructor.replace("_f1", "").replace("_racing", "").capitalize()
+
+# =======================
+# TYPED FINAL_DF ARTIFACT
+# =======================
+# final_df is stored twice: the CSV export and a NumPy .npz bundle holding one
+# array per column with an explicit dtype, plus the entity codes. Readers load
+# the bundle, so the hundreds of one-hot columns are never re-inferred from
+# text or decoded again.
+
+def typed_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".npz"
+
+def is_onehot_column(col):
+    return col.startswith(ONEHOT_PREFIXES) and col not in CONSTRUCTOR_STAT_COLS
+
+def _column_array(series):
+    values = series.to_numpy()
+    if series.dtype == object:
+        mask = series.isna().to_numpy()
+        return series.fillna("").astype(str).to_numpy(dtype=str), mask
+    if is_onehot_column(series.name) and np.issubdtype(series.dtype, np.integer):
+        if series.isin([0, 1]).all():
+            return values.astype(np.int8), None
+    return values, None
+
+def write_typed_final_df(df, path):
+    columns = [c for c in df.columns if c not in ENTITY_PREFIXES]
+    arrays = {"__columns__": np.array(columns, dtype=str)}
+    for i, col in enumerate(columns):
+        values, null_mask = _column_array(df[col])
+        arrays[f"c{i}"] = values
+        if null_mask is not None:
+            arrays[f"n{i}"] = null_mask
+    for entity in ENTITY_PREFIXES:
+        arrays[f"e_{entity}"] = entity_codes(df, entity)
+
+    # Write then rename so concurrent readers never see a partial bundle
+    write_atomic(path, lambda f: np.savez(f, **arrays), binary=True)
+
+def read_typed_final_df(path):
+    with np.load(path, allow_pickle=False) as bundle:
+        columns = bundle["__columns__"].tolist()
+        data = {}
+        for i, col in enumerate(columns):
+            values = bundle[f"c{i}"]
+            if values.dtype.kind == "U":
+                values = values.astype(object)
+                null_key = f"n{i}"
+                if null_key in bundle.files:
+                    values[bundle[null_key]] = np.nan
+            data[col] = values
+        codes = {
+            entity: bundle[f"e_{entity}"]
+            for entity in ENTITY_PREFIXES
+            if f"e_{entity}" in bundle.files
+        }
+    return add_entity_columns(pd.DataFrame(data, columns=columns), codes)
+
+def _is_fresh(npz_path, csv_path):
+    if not os.path.exists(npz_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(npz_path) >= os.path.getmtime(csv_path)
+
+def load_final_df(csv_path=FINAL_DF_PATH):
+    npz_path = typed_path(csv_path)
+    if _is_fresh(npz_path, csv_path):
+        try:
+            return read_typed_final_df(npz_path)
+        except Exception as e:
+            if not os.path.exists(csv_path):
+                raise
+            print(f"[WARN] Could not read typed final_df {npz_path}, re-parsing the CSV: {e}")
+
+    df = pd.read_csv(csv_path)
+    try:
+        write_typed_final_df(df, npz_path)
+    except OSError as e:
+        print(f"[WARN] Could not write typed final_df to {npz_path}: {e}")
+    return add_entity_columns(df)
+
+def save_final_df(df, csv_path=FINAL_DF_PATH):
+    df.to_csv(csv_path, index=False)
+    # Re-read the export so the typed bundle carries exactly the dtypes CSV readers saw
+    write_typed_final_df(pd.read_csv(csv_path), typed_path(csv_path))
@@ -3,46 +3,71 @@ import os
 import pandas as pd
 import numpy as np
 
+from ml.artifacts import write_json_atomic
+from ml.dataset import constructor_display_name, load_final_df
+from ml.model_cache import (
+    MODEL_CACHE_DIR, cached_model_path, frame_digest, load_cached_model, round_digests, save_cached_model,
+)
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 RESULTS_PATH_DRIVERS = os.path.join(BASE_DIR, "driver_strengths.json")
 FINAL_DF_PATH = os.path.join(BASE_DIR, "final_df.csv")
+DRIVER_TABLES_CACHE_DIR = MODEL_CACHE_DIR
 
-def predict_driver_strengths(start_year: int = 2010, end_year: int = 2025):
-    print(f"Calculating driver strengths from {start_year} to {end_year}...")
-    df = pd.read_csv(FINAL_DF_PATH)
+DRIVER_TABLES_NAME = "driver_tables"
+
+EXTREME_ROUNDS = 5
+
+def compute_driver_extremes(records, n=EXTREME_ROUNDS):
+    """Best and worst `n` rounds by rating for every driver, keyed by season then driver."""
+    df = pd.DataFrame(records, columns=['season', 'round', 'driver', 'rating', 'track_id'])
+    extremes = {}
     if df.empty:
-        return []
+        return extremes
 
-    # --- Ensure circuit_id exists (build from boolean one-hot if necessary) ---
-    if 'circuit_id' not in df.columns:
-        circuit_onehots = [c for c in df.columns if c.startswith('circuit_id_')]
-        if circuit_onehots:
-            mask = (df[circuit_onehots] == 1)
-            idx = mask.idxmax(axis=1)
-            no_true = mask.sum(axis=1) == 0
-            idx[no_true] = np.nan
-            df['circuit_id'] = idx.str.replace('circuit_id_', '', regex=False)
-        elif 'circuit' in df.columns:
-            df['circuit_id'] = df['circuit'].astype(str)
-        else:
-            raise RuntimeError("No circuit identifier found in final_df (need 'circuit_id' or circuit_id_*).")
-    df['circuit_id'] = df['circuit_id'].astype(object)
+    df = df.sort_values(['season', 'driver', 'rating'], ascending=[True, True, False], kind='mergesort')
+    for (season, driver), sub in df.groupby(['season', 'driver'], sort=False):
+        rows = sub[['round', 'driver', 'rating', 'track_id']].to_dict(orient='records')
+        extremes.setdefault(int(season), {})[driver] = {
+            "best_rounds": rows[:n],
+            "worst_rounds": rows[-n:][::-1],
+        }
+    return extremes
 
-    # --- Identify valid constructor columns ---
-    constructor_cols = [
-        c for c in df.columns
-        if c.startswith("constructor_") and c not in ["constructor_wins", "constructor_points", "constructor_standings_pos"]
-    ]
+def weighted_group_means(frame, keys, value_cols, weight_col):
+    """Row count and weighted mean of each value column per group of `keys`.
 
-    # --- Focus dataset on target range ---
-    df_target = df[(df['season'] >= start_year) & (df['season'] <= end_year)].copy()
-    drivers_target = sorted(df_target['driver'].dropna().unique())
-    rounds_target = sorted(df_target['round'].dropna().unique())
+    Missing values drop out of both the numerator and the weight sum; a group
+    with no valid values (or zero weight) gets NaN. Missing weights count as 1.
+    """
+    weights = frame[weight_col].fillna(1.0)
+    sums = {'count': pd.Series(1, index=frame.index)}
+    for col in value_cols:
+        values = frame[col].astype(float)
+        valid = values.notna()
+        sums[f'{col}__num'] = (values * weights).where(valid, 0.0)
+        sums[f'{col}__den'] = weights.where(valid, 0.0)
+    grouped = pd.DataFrame(sums).groupby([frame[k] for k in keys]).sum()
 
-    if len(drivers_target) == 0 or len(rounds_target) == 0:
-        return []
+    out = pd.DataFrame({'count': grouped['count'].astype(int)}, index=grouped.index)
+    for col in value_cols:
+        den = grouped[f'{col}__den']
+        out[col] = (grouped[f'{col}__num'] / den).where(den != 0)
+    return out.reset_index()
+
+TRACK_RATING_COLUMNS = ['rating', 'race_count', 'career_score', 'combined_score', 'track_raw_score']
+UNKNOWN_DRIVER_START_RATING = 55.0
+
+# =======================
+# RATING TABLES
+# =======================
+def build_rating_tables(df, drivers_target, end_year):
+    """Track and career rating tables from every season before `end_year`.
 
+    Returns {"track": per-(driver, track_id) ratings, "career": per-driver
+    career scores, "cs_mean": mean career score used for unknown drivers}.
+    """
     hist = df[(df['season'] < end_year) & (df['driver'].isin(drivers_target))].copy()
     for col in ['podium', 'grid', 'driver_points']:
         if col not in hist.columns:
@@ -60,46 +85,18 @@ def predict_driver_strengths(start_year: int = 2010, end_year: int = 2025):
     else:
         hist['season_weight'] = pd.Series(dtype=float)
 
-    def wavg(vals, weights):
-        vals = np.array(vals, dtype=float)
-        weights = np.array(weights, dtype=float)
-        mask = ~np.isnan(vals)
-        if mask.sum() == 0 or weights[mask].sum() == 0:
-            return np.nan
-        return (vals[mask] * weights[mask]).sum() / weights[mask].sum()
+    value_cols = ['podium', 'grid', 'podium_top3', 'win_flag', 'driver_points']
 
-    track_records = []
-    if not hist.empty:
-        for (driver, circuit), sub in hist.groupby(['driver', 'circuit_id'], dropna=False):
-            if pd.isna(driver) or pd.isna(circuit):
-                continue
-            w = sub['season_weight'].fillna(1.0)
-            track_records.append({
-                'driver': driver,
-                'circuit_id': str(circuit),
-                'race_count': int(len(sub)),
-                'avg_finish': wavg(sub['podium'], w),
-                'avg_grid': wavg(sub['grid'], w),
-                'podium_rate': wavg(sub['podium_top3'], w),
-                'win_rate': wavg(sub['win_flag'], w),
-                'pts_per_race': wavg(sub['driver_points'], w)
-            })
-    perf = pd.DataFrame(track_records)
-
-    career_records = []
-    if not hist.empty:
-        for driver, sub in hist.groupby('driver'):
-            w = sub['season_weight'].fillna(1.0)
-            career_records.append({
-                'driver': driver,
-                'career_race_count': int(len(sub)),
-                'career_avg_finish': wavg(sub['podium'], w),
-                'career_avg_grid': wavg(sub['grid'], w),
-                'career_podium_rate': wavg(sub['podium_top3'], w),
-                'career_win_rate': wavg(sub['win_flag'], w),
-                'career_pts_per_race': wavg(sub['driver_points'], w)
-            })
-    career = pd.DataFrame(career_records)
+    track_cols = ['driver', 'circuit_id', 'race_count', 'avg_finish', 'avg_grid', 'podium_rate', 'win_rate', 'pts_per_race']
+    track_hist = hist.dropna(subset=['driver', 'circuit_id'])
+    perf = weighted_group_means(track_hist, ['driver', 'circuit_id'], value_cols, 'season_weight')
+    perf.columns = track_cols
+    perf['circuit_id'] = perf['circuit_id'].astype(str)
+
+    career_cols = ['driver', 'career_race_count', 'career_avg_finish', 'career_avg_grid',
+                   'career_podium_rate', 'career_win_rate', 'career_pts_per_race']
+    career = weighted_group_means(hist.dropna(subset=['driver']), ['driver'], value_cols, 'season_weight')
+    career.columns = career_cols
     if career.empty:
         career = pd.DataFrame([{
             'driver': d,
@@ -166,118 +163,252 @@ def predict_driver_strengths(start_year: int = 2010, end_year: int = 2025):
     perf['combined_score_clipped'] = perf['combined_score'].clip(0.0, 1.0)
     perf['rating'] = (50.0 + 50.0 * perf['combined_score_clipped']).round(1)
 
-    perf_lookup = perf.set_index(['driver', 'circuit_id']) if not perf.empty else None
-    career_lookup = career_tmp.set_index('driver') if not career_tmp.empty else pd.DataFrame()
+    # --- Join tables: track rows (first per key) and career rows ---
+    track_cols = TRACK_RATING_COLUMNS
+    track_table = (
+        perf.dropna(subset=['circuit_id'])
+            .drop_duplicates(subset=['driver', 'circuit_id'])
+            [['driver', 'circuit_id'] + track_cols]
+            .rename(columns={'circuit_id': 'track_id'})
+    )
+    track_table['has_track'] = True
+    career_table = career_tmp.drop_duplicates(subset=['driver'])[['driver', 'career_score', 'career_race_count']]
+    return {"track": track_table, "career": career_table, "cs_mean": cs_mean}
+
+def rating_tables(df, drivers_target, end_year):
+    """(tables, digest, cached) with the tables reused while their history slice is unchanged."""
+    hist_cols = [c for c in ['season', 'driver', 'circuit_id', 'podium', 'grid'] if c in df.columns]
+    hist = df.loc[(df['season'] < end_year) & (df['driver'].isin(drivers_target)), hist_cols]
+    digest = frame_digest(hist, config=f"{end_year}|" + "\x1f".join(map(str, drivers_target)))
+    path = cached_model_path(DRIVER_TABLES_NAME, end_year, DRIVER_TABLES_CACHE_DIR)
+
+    entry = load_cached_model(path, digest)
+    if entry is not None:
+        return entry["tables"], digest, True
+
+    tables = build_rating_tables(df, drivers_target, end_year)
+    try:
+        save_cached_model(path, digest, tables=tables)
+    except OSError as e:
+        print(f"[WARN] Could not cache driver rating tables: {e}")
+    return tables, digest, False
+
+# =======================
+# ROUND RECORDS
+# =======================
+def round_circuits(df_target):
+    """First known circuit of every (season, round), as a string."""
+    return df_target.groupby(['season', 'round'])['circuit_id'].first().dropna().astype(str)
 
-    UNKNOWN_DRIVER_START_RATING = 55.0
+def driver_round_records(df_target, tables):
+    """Flat rating records for every driver of every round in `df_target`, in season/round/driver order."""
+    # --- Round roster: one row per (season, round, driver), first row wins ---
+    roster = (
+        df_target.dropna(subset=['driver', 'round'])
+                 .drop_duplicates(subset=['season', 'round', 'driver'])
+                 [['season', 'round', 'driver', 'constructor_name']]
+    )
+    roster = roster.merge(round_circuits(df_target).rename('track_id').reset_index(), on=['season', 'round'], how='left')
+    roster = roster.sort_values(['season', 'round', 'driver'], kind='mergesort').reset_index(drop=True)
+
+    # --- Join the track table and the career table ---
+    track_table, career_table, cs_mean = tables['track'], tables['career'], tables['cs_mean']
+    roster = roster.merge(track_table, on=['driver', 'track_id'], how='left')
+    roster = roster.merge(career_table.rename(columns={'career_score': 'career_only_score'}), on='driver', how='left')
+
+    columns = ['season', 'round', 'driver', 'track_id', 'constructor_name', 'has_track', 'career_only_score',
+               'career_race_count'] + TRACK_RATING_COLUMNS
     out_records = []
+    for (season, rnd, driver, track_id, constructor, has_track, career_only_score,
+         career_race_count, rating, race_count, career_score, combined_score, track_raw_score) in zip(
+            *(roster[c].tolist() for c in columns)):
+        if pd.isna(track_id):
+            track_id = None
+
+        if has_track is True:
+            race_count = int(race_count)
+            track_raw_score = float(track_raw_score) if pd.notna(track_raw_score) else None
+        elif pd.notna(career_race_count):
+            career_score = float(career_only_score)
+            combined_score = career_score
+            rating = round(50.0 + 50.0 * min(max(career_score, 0.0), 1.0), 1)
+            race_count = int(career_race_count)
+            track_raw_score = None
+        else:
+            career_score = float(cs_mean)
+            combined_score = career_score
+            rating = float(UNKNOWN_DRIVER_START_RATING)
+            race_count = 0
+            track_raw_score = None
+
+        out_records.append({
+            "season": int(season),
+            "round": int(rnd),
+            "driver": str(driver),
+            "track_id": track_id,
+            "constructor": constructor if isinstance(constructor, str) else "Unknown",
+            "rating": float(round(float(rating), 1)),
+            "race_count": int(race_count),
+            "career_score": float(career_score),
+            "combined_score": float(combined_score),
+            "track_raw_score": track_raw_score,
+        })
+
+    return out_records
+
+def nest_driver_records(out_records, driver_extremes, sources):
+    """Season/round JSON structure built in one pass over records in season, round order.
 
-    # --- Process each season and round ---
-    for season in range(start_year, end_year + 1):
-        df_season = df_target[df_target['season'] == season]
-        rounds_season = sorted(df_season['round'].dropna().unique())
-
-        for rnd in rounds_season:
-            df_round = df_season[df_season['round'] == rnd]
-            drivers_this_round = sorted(df_round['driver'].dropna().unique())
-            circuit_ids = df_round['circuit_id'].dropna().unique()
-            circuit_id = str(circuit_ids[0]) if len(circuit_ids) > 0 else None
-
-            for driver in drivers_this_round:
-                # --- Lookup track/career performance ---
-                track_row = None
-                if perf_lookup is not None and circuit_id is not None:
-                    try:
-                        row = perf_lookup.loc[(driver, circuit_id)]
-                        if isinstance(row, pd.DataFrame):
-                            row = row.iloc[0]
-                        track_row = row
-                    except KeyError:
-                        track_row = None
-
-                if isinstance(track_row, pd.Series):
-                    rating = float(track_row.get('rating', 55.0))
-                    race_count = int(track_row.get('race_count', 0))
-                    career_score = float(track_row.get('career_score', 0.5))
-                    combined_score = float(track_row.get('combined_score', 0.5))
-                    track_raw_score = (
-                        float(track_row['track_raw_score']) 
-                        if 'track_raw_score' in track_row and pd.notna(track_row['track_raw_score'])
-                        else None
-                    )
-                else:
-                    if driver in career_lookup.index:
-                        crow = career_lookup.loc[driver]
-                        career_score = float(crow['career_score'])
-                        combined_score = career_score
-                        rating = round(50.0 + 50.0 * min(max(career_score, 0.0), 1.0), 1)
-                        race_count = int(crow['career_race_count'])
-                        track_raw_score = None
-                    else:
-                        career_score = float(cs_mean)
-                        combined_score = career_score
-                        rating = float(UNKNOWN_DRIVER_START_RATING)
-                        race_count = 0
-                        track_raw_score = None
-
-                constructor = None
-                driver_row = df_round[df_round['driver'] == driver]
-                if not driver_row.empty:
-                    row = driver_row.iloc[0]
-                    for col in constructor_cols:
-                        if int(row[col]) == 1:
-                            constructor = col.replace("constructor_", "").replace("_f1", "").replace("_racing", "").capitalize()
-                            break
-                if constructor is None:
-                    constructor = "Unknown"
-
-                out_records.append({
-                    "season": int(season),
-                    "round": int(rnd),
-                    "driver": str(driver),
-                    "constructor": constructor,
-                    "rating": float(round(float(rating), 1)),
-                    "race_count": int(race_count),
-                    "career_score": float(career_score),
-                    "combined_score": float(combined_score),
-                    "track_raw_score": float(track_raw_score) if track_raw_score is not None else None
-                })
-
-    # --- Structure final JSON ---
+    Each round records `sources[(season, round)]`, the digest of the inputs
+    it was computed from.
+    """
     season_records = []
-    for season in range(start_year, end_year + 1):
-        df_season = [r for r in out_records if r['season'] == season]
-        if not df_season:
-            continue
-        rounds_season = sorted({r['round'] for r in df_season})
-        season_data = {"season": season, "rounds": []}
-
-        for rnd in rounds_season:
-            predictions = []
-            for r in df_season:
-                if r['round'] == rnd:
-                    predictions.append({
-                        "driver": r['driver'],
-                        "constructor": r['constructor'],
-                        "rating": r['rating'],
-                        "race_count": r['race_count'],
-                        "career_score": r['career_score'],
-                        "combined_score": r['combined_score'],
-                        "track_raw_score": r['track_raw_score'],
-                        "win_count": 99,
-                        "points_count": 99,
-                        "overtakes_count": 99,
-                        "dry_rating": 99,
-                        "wet_rating": 99,
-                        "quali_rating": 99,
-                        "dnf_rate": 99,
-                    })
-            season_data["rounds"].append({"round": rnd, "predictions": predictions})
-
-        season_records.append(season_data)
-
-    with open(RESULTS_PATH_DRIVERS, 'w') as f:
-        json.dump(season_records, f, indent=2)
-
-    print(f"Driver strengths saved to {RESULTS_PATH_DRIVERS} (seasons: {len(season_records)})")
+    season_data = None
+    round_data = None
+    for r in out_records:
+        if season_data is None or season_data["season"] != r['season']:
+            season_data = {"season": r['season'], "rounds": []}
+            season_records.append(season_data)
+            round_data = None
+        if round_data is None or round_data["round"] != r['round']:
+            round_data = {"round": r['round'], "source_sha256": sources.get((r['season'], r['round'])), "predictions": []}
+            season_data["rounds"].append(round_data)
+        round_data["predictions"].append({
+            "driver": r['driver'],
+            "constructor": r['constructor'],
+            "rating": r['rating'],
+            "race_count": r['race_count'],
+            "career_score": r['career_score'],
+            "combined_score": r['combined_score'],
+            "track_raw_score": r['track_raw_score'],
+            "win_count": 99,
+            "points_count": 99,
+            "overtakes_count": 99,
+            "dry_rating": 99,
+            "wet_rating": 99,
+            "quali_rating": 99,
+            "dnf_rate": 99,
+        })
+    for season_data in season_records:
+        season_data["driver_extremes"] = driver_extremes.get(season_data["season"], {})
+
+    return season_records
+
+def stale_rounds(previous, sources):
+    """(season, round) pairs whose recorded source digest differs from `sources`.
+
+    Rounds only in `previous` or only in `sources` count as stale too.
+    """
+    recorded = {
+        (season_data["season"], round_data["round"]): round_data.get("source_sha256")
+        for season_data in previous for round_data in season_data.get("rounds", [])
+    }
+    return sorted(key for key in set(recorded) | set(sources) if recorded.get(key) != sources.get(key))
+
+def update_driver_rounds(previous, df_target, tables, changed_rounds, sources):
+    """Patch saved season records with fresh ratings for `changed_rounds` only.
+
+    Untouched rounds are kept as they are; driver extremes are recomputed
+    for the seasons that changed.
+    """
+    changed = {(int(season), int(rnd)) for season, rnd in changed_rounds}
+    keys = pd.MultiIndex.from_arrays([df_target['season'], df_target['round']])
+    fresh = nest_driver_records(driver_round_records(df_target[keys.isin(list(changed))], tables), {}, sources)
+    fresh_rounds = {
+        (season_data["season"], round_data["round"]): round_data
+        for season_data in fresh for round_data in season_data["rounds"]
+    }
+
+    by_season = {season_data["season"]: season_data for season_data in previous}
+    affected = sorted({season for season, _ in changed})
+    for season in affected:
+        season_data = by_season.get(season, {"season": season, "rounds": []})
+        rounds = {r["round"]: r for r in season_data["rounds"] if (season, r["round"]) not in changed}
+        rounds.update({rnd: r for (s, rnd), r in fresh_rounds.items() if s == season})
+        season_data["rounds"] = [rounds[rnd] for rnd in sorted(rounds)]
+        if rounds:
+            by_season[season] = season_data
+        else:
+            by_season.pop(season, None)
+
+    track_ids = round_circuits(df_target).to_dict()
+    extreme_records = [
+        {
+            "season": season,
+            "round": round_data["round"],
+            "driver": p["driver"],
+            "rating": p["rating"],
+            "track_id": track_ids.get((season, round_data["round"])),
+        }
+        for season in affected if season in by_season
+        for round_data in by_season[season]["rounds"]
+        for p in round_data["predictions"]
+    ]
+    driver_extremes = compute_driver_extremes(extreme_records)
+    for season in affected:
+        if season in by_season:
+            by_season[season]["driver_extremes"] = driver_extremes.get(season, {})
+
+    return [by_season[season] for season in sorted(by_season)]
+
+def _load_previous_results():
+    try:
+        with open(RESULTS_PATH_DRIVERS, 'r') as f:
+            previous = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return previous if isinstance(previous, list) else None
+
+# =======================
+# DRIVER STRENGTH PREDICTION
+# =======================
+def predict_driver_strengths(start_year: int = 2010, end_year: int = 2025, incremental: bool = True, df=None):
+    """Driver ratings for every round from `start_year` to `end_year`.
+
+    Every saved round records a digest of its final_df rows and the rating
+    tables it used. With `incremental`, rounds whose digest still matches are
+    kept from the saved results and only the rest are recomputed, provided
+    the rating tables are unchanged; otherwise everything is rebuilt.
+    """
+    print(f"Calculating driver strengths from {start_year} to {end_year}...")
+    df = load_final_df(FINAL_DF_PATH) if df is None else df.copy(deep=False)
+    if df.empty:
+        return []
+
+    # --- Circuit and constructor come from the dataset's entity codes ---
+    if 'circuit_id' not in df.columns:
+        df['circuit_id'] = df['circuit']
+    df['circuit_id'] = df['circuit_id'].astype(object)
+    df['constructor_name'] = df['constructor'].astype(object).map(constructor_display_name)
+
+    # --- Focus dataset on target range ---
+    df_target = df[(df['season'] >= start_year) & (df['season'] <= end_year)].copy()
+    drivers_target = sorted(df_target['driver'].dropna().unique())
+    rounds_target = sorted(df_target['round'].dropna().unique())
+
+    if len(drivers_target) == 0 or len(rounds_target) == 0:
+        return []
+
+    tables, tables_digest, cached = rating_tables(df, drivers_target, end_year)
+    sources = round_digests(df_target, config=tables_digest)
+
+    previous = _load_previous_results() if incremental and cached else None
+    if previous is not None:
+        changed = stale_rounds(previous, sources)
+        if not changed:
+            print("Driver strengths unchanged (every round matches its saved inputs)")
+            return previous
+        season_records = update_driver_rounds(previous, df_target, tables, changed, sources)
+        mode = f"updated {len(changed)} round(s)"
+    else:
+        out_records = driver_round_records(df_target, tables)
+
+        # --- Best/worst rounds per driver, served as-is by the ML route ---
+        driver_extremes = compute_driver_extremes(out_records)
+        season_records = nest_driver_records(out_records, driver_extremes, sources)
+        mode = "full rebuild"
+
+    write_json_atomic(RESULTS_PATH_DRIVERS, season_records, indent=2)
+
+    print(f"Driver strengths saved to {RESULTS_PATH_DRIVERS} (seasons: {len(season_records)}, {mode})")
     return season_records
\ No newline at end of file
@@ -1,80 +1,307 @@
 import json
+import multiprocessing
 import os
-import pandas as pd
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 
+from ml.artifacts import write_text_atomic
+from ml.standings import gp_predictions_digest, save_standings
+from ml.dataset import constructor_display_name, load_final_df
+from ml.model_cache import (
+    MODEL_CACHE_DIR, cached_model_path, load_cached_model, save_cached_model, training_slice_digest,
+)
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 RESULTS_PATH_GP = os.path.join(BASE_DIR, "gp_predictions.json")
 FINAL_DF_PATH = os.path.join(BASE_DIR, "final_df.csv")
+GP_MODEL_CACHE_DIR = MODEL_CACHE_DIR
+
+# Processes used to fit uncached seasons; 1 keeps training in-process.
+# Only cold fits run in the pool: warm starts chain season to season.
+GP_TRAIN_WORKERS = 1
+
+# Training targets predict_gp_results can fit:
+#   "position" - multinomial over every finishing position, reporting
+#                predict_proba[:, 1] as-is (the original behaviour)
+#   "win"      - binary winner / non-winner, renormalized so each round's
+#                probabilities sum to 100%
+GP_TARGETS = ("position", "win")
+GP_TARGET = "position"
+
+# Cache name and config per target. The config is part of the cache key:
+# changing the model setup invalidates every season. How the solver was
+# started is appended (see model_config), so warm and cold fits never reuse
+# each other's entries.
+GP_MODEL_NAMES = {"position": "gp", "win": "gp_win"}
+GP_MODEL_CONFIGS = {
+    "position": "StandardScaler+LogisticRegression(max_iter=500)",
+    "win": "StandardScaler+LogisticRegression(max_iter=500);y=podium==1",
+}
 
 # =======================
-# GP RESULTS PREDICTION
+# OUTPUT ASSEMBLY
 # =======================
-def predict_gp_results(start_year: int = 2010, end_year: int = 2025):
-    print("Training and predicting GP results...")
-    df = pd.read_csv(FINAL_DF_PATH)
+def normalize_per_round(rounds, probabilities):
+    """Scale probabilities so they sum to 1 within each round."""
+    _, inverse = np.unique(rounds, return_inverse=True)
+    totals = np.bincount(inverse, weights=probabilities)
+    totals[totals == 0] = 1.0
+    return probabilities / totals[inverse]
+
+def assemble_round_predictions(test, probabilities):
+    """Per-round prediction lists for one season, highest probability first.
+
+    Rows with equal rounded probability keep their final_df order, as the
+    previous per-round stable sort did.
+    """
+    rounds = test['round'].to_numpy()
+    # Python's round() on the scaled float, not np.round, so values match exactly
+    rounded = np.array([round(p, 2) for p in (probabilities * 100).tolist()])
+    order = np.lexsort((-rounded, rounds))
 
-    constructor_cols = [
-        c for c in df.columns 
-        if c.startswith("constructor_") 
-        and c not in ["constructor_wins", "constructor_points", "constructor_standings_pos"]
+    drivers = test['driver'].to_numpy()[order].tolist()
+    constructors = [
+        c if isinstance(c, str) else "Unknown"
+        for c in test['constructor_name'].to_numpy()[order].tolist()
     ]
+    rounded = rounded[order].tolist()
+    rounds = rounds[order]
 
-    seasons = sorted([s for s in df['season'].unique() if start_year <= s <= end_year])
-    all_results = []
+    starts = np.flatnonzero(np.r_[True, rounds[1:] != rounds[:-1]]).tolist()
+    ends = starts[1:] + [len(order)]
+    return [
+        {
+            "round": int(rounds[start]),
+            "predictions": [
+                {"driver": drivers[i], "constructor": constructors[i], "probability": rounded[i]}
+                for i in range(start, end)
+            ],
+        }
+        for start, end in zip(starts, ends)
+    ]
+
+# =======================
+# WALK-FORWARD MODELS
+# =======================
+def target_labels(podium, target):
+    if target == "win":
+        return (podium == 1).astype(np.int8)
+    return podium
+
+class DesignMatrix:
+    """final_df's numeric features as one C-contiguous float64 matrix.
+
+    Rows are stably sorted by (season, round), so the expanding training
+    window for a season is the prefix X[:start] and its test rows are
+    X[start:end] -- both views, never copies. float64 is what
+    StandardScaler and the lbfgs solver work in, so the views reach the
+    model without a dtype conversion.
+    """
+
+    DROP_COLS = ['driver', 'podium', 'date']
+    ROW_COLS = ['round', 'driver', 'constructor_name']
+
+    def __init__(self, df):
+        self.columns = [
+            col for col, dtype in df.dtypes.items()
+            if col not in self.DROP_COLS and isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.number)
+        ]
+
+        order = np.lexsort((df['round'].to_numpy(), df['season'].to_numpy()))
+        self.X = np.empty((len(df), len(self.columns)), dtype=np.float64)
+        for j, col in enumerate(self.columns):
+            self.X[:, j] = df[col].to_numpy()[order]
+
+        self.podium = df['podium'].to_numpy()[order]
+        self.seasons = df['season'].to_numpy()[order]
+        # The few columns output assembly needs, in matrix row order
+        self.rows = df[self.ROW_COLS].iloc[order].reset_index(drop=True)
 
+    def season_bounds(self, season):
+        """(start, end) such that X[:start] is every earlier season and X[start:end] is `season`."""
+        return (
+            int(np.searchsorted(self.seasons, season, side='left')),
+            int(np.searchsorted(self.seasons, season, side='right')),
+        )
+
+def model_config(target, warm_start, previous=None):
+    """Cache config for a fit; a warm fit also names the entry it chained from."""
+    if not warm_start:
+        return f"{GP_MODEL_CONFIGS[target]};start=cold"
+    chained_from = previous["training_sha256"] if previous is not None else "none"
+    return f"{GP_MODEL_CONFIGS[target]};start=warm;from={chained_from}"
+
+def load_season_model(season, columns, X_train, y_train, target, warm_start, previous=None, cache_dir=None):
+    """(training slice digest, cached entry or None) for `season`."""
+    config = model_config(target, warm_start, previous)
+    digest = training_slice_digest(columns, X_train, y_train, config)
+    path = cached_model_path(GP_MODEL_NAMES[target], season, cache_dir or GP_MODEL_CACHE_DIR)
+    return digest, load_cached_model(path, digest)
+
+def fit_season_model(season, columns, X_train, y_train, target, digest, previous=None, warm_start=True, cache_dir=None):
+    """Fit and cache the scaler and model for `season`.
+
+    The solver starts from `previous` (the prior season's cache entry) when
+    it has the same feature layout and the same set of classes; the window
+    only grows, so a season can add finishing positions the previous model
+    never saw.
+    """
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+
+    model = LogisticRegression(max_iter=500)
+    if (
+        warm_start and previous is not None and previous["columns"] == columns
+        and np.array_equal(previous["model"].classes_, np.unique(y_train))
+    ):
+        model.set_params(warm_start=True)
+        model.coef_ = previous["model"].coef_.copy()
+        model.intercept_ = previous["model"].intercept_.copy()
+    model.fit(X_train_scaled, y_train)
+    model.set_params(warm_start=False)
+
+    path = cached_model_path(GP_MODEL_NAMES[target], season, cache_dir or GP_MODEL_CACHE_DIR)
+    try:
+        return save_cached_model(path, digest, columns=columns, scaler=scaler, model=model)
+    except OSError as e:
+        print(f"[WARN] Could not cache GP model for {season}: {e}")
+        return {"training_sha256": digest, "columns": columns, "scaler": scaler, "model": model}
+
+def train_seasons_serial(seasons, design, y, target, warm_start=True):
+    """{season: entry} fitting in season order, each refit warm-started from the season before."""
+    entries = {}
+    previous = None
     for season in seasons:
-        train = df[df.season < season]
-        test = df[df.season == season]
+        start, _ = design.season_bounds(season)
+        X_train, y_train = design.X[:start], y[:start]
+        digest, entry = load_season_model(season, design.columns, X_train, y_train, target, warm_start, previous)
+        if entry is None:
+            entry = fit_season_model(season, design.columns, X_train, y_train, target, digest, previous, warm_start)
+            entry["refit"] = True
+        entries[season] = previous = entry
+    return entries
 
-        if train.empty or test.empty:
-            continue
+# Set in each pool worker by _init_worker: memory-mapped views of the
+# design matrix and labels written once by the parent.
+_SHARED = {}
 
-        drop_cols = ['driver', 'podium', 'date']
-        X_train = train.drop(columns=[c for c in drop_cols if c in train.columns]).select_dtypes(include=[np.number])
-        y_train = train.podium
+def _init_worker(paths, columns, cache_dir):
+    _SHARED.update({name: np.load(path, mmap_mode='r') for name, path in paths.items()})
+    _SHARED["columns"] = columns
+    _SHARED["cache_dir"] = cache_dir
 
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
+def _fit_season_task(season, start, target, digest):
+    return season, fit_season_model(
+        season, _SHARED["columns"], _SHARED["X"][:start], _SHARED["y"][:start],
+        target, digest, warm_start=False, cache_dir=_SHARED["cache_dir"],
+    )
 
-        model = LogisticRegression(max_iter=500)
-        model.fit(X_train_scaled, y_train)
+def train_seasons_parallel(seasons, design, y, target, workers):
+    """{season: entry} with cache misses fit cold across a pool of `workers` processes.
 
-        season_results = {"season": int(season), "rounds": []}
+    Workers read the design matrix from a memory-mapped .npy instead of
+    receiving a pickled copy per task. This may run alongside other pipeline
+    stages' threads, so workers are never forked from this process: they
+    come from a forkserver where available, else are spawned (Windows).
+    """
+    entries = {}
+    misses = []
+    for season in seasons:
+        start, _ = design.season_bounds(season)
+        digest, entry = load_season_model(season, design.columns, design.X[:start], y[:start], target, False)
+        if entry is None:
+            misses.append((season, start, digest))
+        else:
+            entries[season] = entry
+    if not misses:
+        return entries
 
-        for rnd in sorted(test['round'].unique()):
-            test_rnd = test[test['round'] == rnd]
-            X_test_rnd = scaler.transform(test_rnd[X_train.columns])
-            probabilities = model.predict_proba(X_test_rnd)[:, 1]
+    with tempfile.TemporaryDirectory(prefix="gp_features_") as shared_dir:
+        paths = {}
+        for name, values in (("X", design.X), ("y", y)):
+            paths[name] = os.path.join(shared_dir, f"{name}.npy")
+            np.save(paths[name], values)
 
-            prediction_records = []
-            for idx, row in test_rnd.iterrows():
-                constructor = None
-                for col in constructor_cols:
-                    if int(row[col]) == 1:
-                        constructor = col.replace("constructor_", "").replace("_f1", "").replace("_racing", "").capitalize()
-                        break
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(misses)),
+            mp_context=multiprocessing.get_context(
+                "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            ),
+            initializer=_init_worker,
+            initargs=(paths, design.columns, GP_MODEL_CACHE_DIR),
+        ) as pool:
+            futures = [
+                pool.submit(_fit_season_task, season, start, target, digest)
+                for season, start, digest in misses
+            ]
+            for future in futures:
+                season, entry = future.result()
+                entry["refit"] = True
+                entries[season] = entry
+    return entries
 
-                prediction_records.append({
-                    "driver": row['driver'],
-                    "constructor": constructor if constructor else "Unknown",
-                    "probability": round(float(probabilities[test_rnd.index.get_loc(idx)]) * 100, 2)
-                })
+# =======================
+# GP RESULTS PREDICTION
+# =======================
+def predict_gp_results(start_year: int = 2010, end_year: int = 2025, warm_start: bool = True,
+                       workers: int = None, target: str = None, df=None):
+    """Walk-forward GP predictions for every season in range.
+
+    `target` picks one of GP_TARGETS (default GP_TARGET). With warm_start
+    each season's fit starts from the one before, so seasons are fit in
+    order; with warm_start=False, `workers` > 1 fits uncached seasons in a
+    process pool (default GP_TRAIN_WORKERS). Output depends only on the
+    data, target and warm_start, never on the worker count or cache history.
+    """
+    target = GP_TARGET if target is None else target
+    if target not in GP_TARGETS:
+        raise ValueError(f"Unknown GP target {target!r}; expected one of {GP_TARGETS}")
+
+    print("Training and predicting GP results...")
+    df = load_final_df(FINAL_DF_PATH) if df is None else df.copy(deep=False)
+
+    df['constructor_name'] = df['constructor'].astype(object).map(constructor_display_name)
+    design = DesignMatrix(df)
+    y = target_labels(design.podium, target)
 
-            prediction_records.sort(key=lambda x: x['probability'], reverse=True)
+    seasons = []
+    for s in sorted([s for s in df['season'].unique() if start_year <= s <= end_year]):
+        # Seasons with no earlier history or no rows of their own are skipped
+        start, end = design.season_bounds(s)
+        if 0 < start < end:
+            seasons.append(s)
+
+    workers = GP_TRAIN_WORKERS if workers is None else workers
+    if workers > 1 and not warm_start and len(seasons) > 1:
+        entries = train_seasons_parallel(seasons, design, y, target, workers)
+    else:
+        entries = train_seasons_serial(seasons, design, y, target, warm_start)
+
+    all_results = []
+    refits = 0
+    for season in seasons:
+        entry = entries[season]
+        refits += entry.pop("refit", False)
 
-            season_results["rounds"].append({
-                "round": int(rnd),
-                "predictions": prediction_records
-            })
+        start, end = design.season_bounds(season)
+        X_test = entry["scaler"].transform(design.X[start:end])
+        probabilities = entry["model"].predict_proba(X_test)[:, 1]
+        test = design.rows.iloc[start:end]
+        if target == "win":
+            probabilities = normalize_per_round(test['round'].to_numpy(), probabilities)
+        all_results.append({
+            "season": int(season),
+            "rounds": assemble_round_predictions(test, probabilities),
+        })
 
-        all_results.append(season_results)
+    serialized = json.dumps(all_results, indent=2)
+    write_text_atomic(RESULTS_PATH_GP, serialized)
 
-    with open(RESULTS_PATH_GP, 'w') as f:
-        json.dump(all_results, f, indent=2)
+    print(f"GP results saved to {RESULTS_PATH_GP} (models refit: {refits}/{len(all_results)})")
 
-    print(f"GP results saved to {RESULTS_PATH_GP}")
-    return all_results
\ No newline at end of file
+    save_standings(all_results, gp_predictions_digest(serialized))
+    return all_results
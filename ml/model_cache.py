@@ -0,0 +1,78 @@
+import hashlib
+import os
+import joblib
+import numpy as np
+import pandas as pd
+
+from ml.artifacts import write_atomic
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODEL_CACHE_DIR = os.path.join(BASE_DIR, "models")
+
+# Bump when the layout of cached entries changes so older files are refit
+CACHE_FORMAT = "2"
+
+# =======================
+# FITTED MODEL CACHE
+# =======================
+# Walk-forward models are persisted one file per (model, season), tagged with
+# a digest of the exact training slice they were fit on. A cached entry is
+# reused only while that digest still matches, so appending races to the
+# current season never forces earlier seasons to be refit.
+
+def training_slice_digest(columns, X, y, config=""):
+    """SHA-256 over the feature names, feature values, labels and model config."""
+    h = hashlib.sha256()
+    h.update(CACHE_FORMAT.encode("utf-8"))
+    h.update(config.encode("utf-8"))
+    h.update("\x1f".join(map(str, columns)).encode("utf-8"))
+    # Hash through the buffer protocol: a C-contiguous float64 prefix view
+    # of the design matrix is read in place rather than copied per season
+    h.update(np.ascontiguousarray(X, dtype=np.float64))
+    h.update(np.ascontiguousarray(y, dtype=np.float64))
+    return h.hexdigest()
+
+def frame_digest(frame, config=""):
+    """SHA-256 over a DataFrame's column names and row-wise pandas hashes."""
+    h = hashlib.sha256()
+    h.update(CACHE_FORMAT.encode("utf-8"))
+    h.update(config.encode("utf-8"))
+    h.update("\x1f".join(map(str, frame.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def round_digests(frame, config=""):
+    """{(season, round): SHA-256 over that round's rows, the column names and `config`}."""
+    prefix = "\x1f".join([CACHE_FORMAT, config] + list(map(str, frame.columns)))
+    row_hashes = pd.util.hash_pandas_object(frame, index=False)
+    grouped = row_hashes.groupby([frame['season'], frame['round']])
+    sums, sizes = grouped.sum(), grouped.size()
+    return {
+        (int(season), int(rnd)): hashlib.sha256(f"{prefix}\x1f{total}\x1f{size}".encode("utf-8")).hexdigest()
+        for (season, rnd), total, size in zip(sums.index, sums.tolist(), sizes.tolist())
+    }
+
+def cached_model_path(model_name, season, cache_dir=None):
+    return os.path.join(cache_dir or MODEL_CACHE_DIR, model_name, f"season_{int(season)}.joblib")
+
+def load_cached_model(path, digest):
+    """Cached payload for `path` if it was fit on the slice `digest`, else None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        entry = joblib.load(path)
+    except Exception as e:
+        print(f"[WARN] Ignoring unreadable model cache {path}: {e}")
+        return None
+    if not isinstance(entry, dict) or entry.get("training_sha256") != digest:
+        return None
+    return entry
+
+def save_cached_model(path, digest, **payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {"training_sha256": digest, **payload}
+
+    # Write then rename so a concurrent reader never loads a partial file
+    write_atomic(path, lambda f: joblib.dump(entry, f), binary=True)
+    return entry
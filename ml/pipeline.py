@@ -0,0 +1,65 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ml.dataset import FINAL_DF_PATH, load_final_df
+from ml.driver_strength_predictor import predict_driver_strengths
+from ml.constructor_strength_predictor import predict_constructor_strengths
+from ml.gp_predictor import predict_gp_results
+
+# (result key, predictor) in the order results are reported
+PIPELINE_STAGES = (
+    ("driver_strengths", predict_driver_strengths),
+    ("constructor_strengths", predict_constructor_strengths),
+    ("gp_results", predict_gp_results),
+)
+
+# =======================
+# PREDICTION PIPELINE
+# =======================
+def run_prediction_pipeline(df=None, stage_kwargs=None, max_workers=None, on_stage=None):
+    """Run the three predictors against one in-memory final_df.
+
+    The dataset is loaded once (unless `df` is given) and the same frame is
+    handed to every predictor; they only add columns to shallow copies, so it
+    is never modified. Stages are independent and run on a thread pool.
+    `stage_kwargs` maps a stage name to extra keyword arguments for it.
+    `max_workers` defaults to one thread per stage.
+    `on_stage(name, status)` is called as each stage goes "running", then
+    "done" or "failed".
+
+    Returns (results, timings): results keyed by stage name, and per-stage
+    wall time in seconds plus "load" and "total".
+    """
+    stage_kwargs = stage_kwargs or {}
+    max_workers = len(PIPELINE_STAGES) if max_workers is None else max_workers
+    stage_times = {}
+    started = time.perf_counter()
+
+    if df is None:
+        df = load_final_df(FINAL_DF_PATH)
+    timings = {"load": time.perf_counter() - started}
+
+    def notify(name, status):
+        if on_stage is not None:
+            on_stage(name, status)
+
+    def run_stage(name, predictor):
+        notify(name, "running")
+        stage_started = time.perf_counter()
+        try:
+            result = predictor(df=df, **stage_kwargs.get(name, {}))
+        except Exception:
+            notify(name, "failed")
+            raise
+        stage_times[name] = time.perf_counter() - stage_started
+        notify(name, "done")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ml-stage") as pool:
+        futures = {name: pool.submit(run_stage, name, predictor) for name, predictor in PIPELINE_STAGES}
+        results = {name: future.result() for name, future in futures.items()}
+
+    timings.update((name, stage_times[name]) for name, _ in PIPELINE_STAGES)
+    timings["total"] = time.perf_counter() - started
+    print("Prediction pipeline finished: " + ", ".join(f"{k} {v:.2f}s" for k, v in timings.items()))
+    return results, timings
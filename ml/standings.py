@@ -0,0 +1,138 @@
+import hashlib
+import os
+import numpy as np
+
+from ml.artifacts import write_json_atomic
+from metadata.driver_metadata import DRIVER_METADATA
+from metadata.driver_resolver import canonical_driver_id
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RESULTS_PATH_STANDINGS = os.path.join(BASE_DIR, "standings.json")
+
+# P1 gets 26 points because of fastest lap
+F1_POINTS = [26, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+
+def gp_predictions_digest(serialized):
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+def _count_matrix(rows, positions, n_rows, n_positions):
+    flat = np.asarray(rows, dtype=np.int64) * n_positions + np.asarray(positions, dtype=np.int64)
+    return np.bincount(flat, minlength=n_rows * n_positions).reshape(n_rows, n_positions)
+
+def _countback_order(season_idx, names, counts, points):
+    # np.lexsort treats the last key as primary: season, then points, then the
+    # number of P1s, P2s, ... and finally the lower-cased name.
+    _, name_rank = np.unique(np.array([n.lower() for n in names], dtype=str), return_inverse=True)
+    keys = [name_rank.reshape(-1)]
+    keys.extend(-counts[:, pos] for pos in range(counts.shape[1] - 1, -1, -1))
+    keys.append(-points)
+    keys.append(season_idx)
+    return np.lexsort(keys)
+
+# =======================
+# SEASON STANDINGS
+# =======================
+def compute_standings_batch(seasons):
+    """Standings for many seasons at once; `seasons` is a list of (key, rounds) pairs."""
+    driver_rows = {}
+    constructor_rows = {}
+    driver_entries, driver_positions = [], []
+    constructor_entries, constructor_positions = [], []
+    driver_constructors = {}
+
+    for s_idx, (_, season_results) in enumerate(seasons):
+        for race in season_results:
+            predictions = race.get("predictions", [])
+            sorted_preds = sorted(predictions, key=lambda x: float(x.get("probability", 0)), reverse=True)
+
+            for i, pred in enumerate(sorted_preds):
+                raw_driver = pred.get("driver")
+                if not raw_driver:
+                    continue
+
+                driver_key = (s_idx, canonical_driver_id(raw_driver))
+                driver_entries.append(driver_rows.setdefault(driver_key, len(driver_rows)))
+                driver_positions.append(i)
+
+                constructor = pred.get("constructor")
+                if constructor:
+                    driver_constructors[driver_key] = constructor
+                    constructor_key = (s_idx, constructor)
+                    constructor_entries.append(constructor_rows.setdefault(constructor_key, len(constructor_rows)))
+                    constructor_positions.append(i)
+
+    n_positions = max(driver_positions, default=0) + 1
+    points_table = np.zeros(n_positions, dtype=np.int64)
+    n_scoring = min(len(F1_POINTS), n_positions)
+    points_table[:n_scoring] = F1_POINTS[:n_scoring]
+
+    standings = {key: {"driver_standings": [], "constructor_standings": []} for key, _ in seasons}
+    season_keys = [key for key, _ in seasons]
+
+    def ranked(entity_rows, entries, positions):
+        if not entity_rows:
+            return []
+        keys = list(entity_rows)
+        counts = _count_matrix(entries, positions, len(keys), n_positions)
+        points = counts @ points_table
+        season_idx = np.array([s_idx for s_idx, _ in keys], dtype=np.int64)
+        order = _countback_order(season_idx, [name for _, name in keys], counts, points)
+        podiums = counts[:, :3] if n_positions >= 3 else np.pad(counts, ((0, 0), (0, 3 - n_positions)))
+        return [(keys[row], int(points[row]), *(int(c) for c in podiums[row])) for row in order]
+
+    for (s_idx, d), pts, firsts, seconds, thirds in ranked(driver_rows, driver_entries, driver_positions):
+        table = standings[season_keys[s_idx]]["driver_standings"]
+        table.append({
+            "position": len(table) + 1,
+            "driver_id": d,
+            "driver": DRIVER_METADATA.get(d, {}).get("full_name", d),
+            "firsts": firsts,
+            "seconds": seconds,
+            "thirds": thirds,
+            "points": pts,
+            "constructor": driver_constructors.get((s_idx, d)),
+            "nationality": DRIVER_METADATA.get(d, {}).get("nationality", None),
+            "image": f"/static/images/drivers/{d}.png",
+        })
+
+    for (s_idx, c), pts, firsts, seconds, thirds in ranked(constructor_rows, constructor_entries, constructor_positions):
+        table = standings[season_keys[s_idx]]["constructor_standings"]
+        table.append({
+            "position": len(table) + 1,
+            "constructor": c,
+            "firsts": firsts,
+            "seconds": seconds,
+            "thirds": thirds,
+            "points": pts
+        })
+
+    return standings
+
+def compute_all_standings(gp_results):
+    seasons = []
+    seen = set()
+    for season_data in gp_results:
+        season_key = str(int(season_data.get("season", -1)))
+        season_results = season_data.get("rounds", [])
+        if season_key in seen or not season_results:
+            continue
+        seen.add(season_key)
+        seasons.append((season_key, season_results))
+    return compute_standings_batch(seasons)
+
+def build_standings(gp_results, gp_digest):
+    """Standings for every season, tagged with the GP predictions they came from."""
+    return {
+        "gp_predictions_sha256": gp_digest,
+        "seasons": compute_all_standings(gp_results),
+    }
+
+def save_standings(gp_results, gp_digest, path=None):
+    """Materialize build_standings() to `path` (default RESULTS_PATH_STANDINGS)."""
+    path = path or RESULTS_PATH_STANDINGS
+    standings = build_standings(gp_results, gp_digest)
+    write_json_atomic(path, standings)
+
+    print(f"Standings saved to {path} (seasons: {len(standings['seasons'])})")
+    return standings
@@ -0,0 +1,53 @@
+import json
+import time
+
+import app.job_queue as job_queue_module
+from app.job_queue import JobQueue
+
+
+def wait_until_finished(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    job = queue.get(job_id)
+    while job["status"] in job_queue_module.ACTIVE_STATUSES and time.monotonic() < deadline:
+        time.sleep(0.01)
+        job = queue.get(job_id)
+    return job
+
+
+def test_stale_active_job_is_replaced_without_fcntl(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue_module, "fcntl", None)
+    jobs_dir = tmp_path / "jobs"
+    jobs_dir.mkdir()
+
+    # A train job left "running" by a process that was interrupted
+    stale_id = "0" * 32
+    (jobs_dir / f"{stale_id}.json").write_text(json.dumps({
+        "id": stale_id, "kind": "train", "status": "running",
+        "submitted_at": None, "started_at": None, "finished_at": None,
+        "stages": {}, "result": None, "error": None,
+    }))
+    (jobs_dir / f"{stale_id}.lock").write_text("")
+    (jobs_dir / "active_train").write_text(stale_id)
+
+    queue = JobQueue(jobs_dir=str(jobs_dir), run_lock_path=str(tmp_path / "run.lock"))
+    job, created = queue.submit("train", ["stage"], lambda progress: {"ok": True})
+
+    assert created
+    assert job["id"] != stale_id
+    assert queue.get(stale_id)["status"] == "failed"
+    assert not (jobs_dir / f"{stale_id}.lock").exists()
+    assert wait_until_finished(queue, job["id"])["status"] == "succeeded"
+
+
+def test_own_running_job_is_deduplicated_without_fcntl(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue_module, "fcntl", None)
+    queue = JobQueue(jobs_dir=str(tmp_path / "jobs"), run_lock_path=str(tmp_path / "run.lock"))
+
+    release = job_queue_module.threading.Event()
+    first, created = queue.submit("train", [], lambda progress: release.wait(5))
+    again, created_again = queue.submit("train", [], lambda progress: None)
+    release.set()
+
+    assert created and not created_again
+    assert again["id"] == first["id"]
+    assert wait_until_finished(queue, first["id"])["status"] == "succeeded"